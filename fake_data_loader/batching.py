@@ -0,0 +1,165 @@
+import time
+from collections import deque
+
+from logger import logger, sampled
+
+
+class AimdController:
+    """
+    Additive-increase / multiplicative-decrease batch size controller.
+
+    With `goal="latency"` the batch grows by `increase` after every flush
+    while the p99 flush latency over the last `window` flushes stays under
+    `target_p99`, and is cut by `decrease` as soon as it goes over. The
+    flush interval is the latency budget left after a flush, so that
+    waiting in the buffer plus flushing stays within `target_p99`.
+
+    With `goal="throughput"` the batch grows while items per second keeps
+    up with the best recently seen and is cut when it falls more than 10%
+    below it. The best value decays so the controller follows changing
+    backend conditions.
+
+    A failed flush cuts the batch by `decrease` under either goal.
+    """
+    def __init__(
+        self,
+        goal: str = "latency",
+        target_p99: float = 0.25,
+        min_batch: int = 1,
+        max_batch: int = 1000,
+        increase: int = 8,
+        decrease: float = 0.5,
+        window: int = 100,
+        min_interval: float = 0.01,
+        max_interval: float = 1.0
+    ) -> None:
+        if goal not in ("latency", "throughput"):
+            raise ValueError(f"Unknown batching goal: {goal}")
+
+        self.goal = goal
+        self.target_p99 = target_p99
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.increase = increase
+        self.decrease = decrease
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+        self.batch_size = float(min_batch)
+        self.flush_interval = max_interval
+        self.latencies = deque(maxlen=window)
+        self.best_throughput = 0.0
+        self.throughput = 0.0
+
+    def p99(self) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+    def observe(self, size: int, latency: float) -> None:
+        """
+        Adjust the batch size and flush interval after a flush of `size`
+        items that took `latency` seconds.
+        """
+        self.latencies.append(latency)
+        self.throughput = size / latency if latency > 0 else float("inf")
+
+        if self.goal == "latency":
+            p99 = self.p99()
+            if p99 > self.target_p99:
+                self.batch_size *= self.decrease
+                self.latencies.clear()
+            else:
+                self.batch_size += self.increase
+            self.flush_interval = min(
+                max(self.target_p99 - p99, self.min_interval),
+                self.max_interval
+            )
+        else:
+            self.best_throughput *= 0.99
+            if self.throughput >= self.best_throughput * 0.9:
+                self.batch_size += self.increase
+                self.best_throughput = max(self.best_throughput, self.throughput)  # noqa: E501
+            else:
+                self.batch_size *= self.decrease
+
+        self.batch_size = min(max(self.batch_size, self.min_batch), self.max_batch)  # noqa: E501
+
+    def fail(self) -> None:
+        """
+        Back off after a flush that raised.
+        """
+        self.batch_size = max(self.batch_size * self.decrease, self.min_batch)  # noqa: E501
+
+    def metrics(self) -> dict:
+        return {
+            "batch_size": int(self.batch_size),
+            "flush_interval_s": self.flush_interval,
+            "p99_flush_latency_s": self.p99(),
+            "throughput": self.throughput,
+        }
+
+
+class AdaptiveBatcher:
+    """
+    Buffer items and hand them to `flush_func` in batches sized by a
+    controller. A batch is flushed when it reaches the controller's batch
+    size or when its oldest item has waited the flush interval. When
+    `flush_func` raises, the batch stays buffered for the next flush.
+    """
+    def __init__(self, name: str, flush_func, controller: AimdController) -> None:  # noqa: E501
+        self.name = name
+        self.flush_func = flush_func
+        self.controller = controller
+        self.buffer = []
+        self.oldest = None
+        self.flushes = 0
+        self.items = 0
+
+    def add(self, item) -> None:
+        if not self.buffer:
+            self.oldest = time.monotonic()
+        self.buffer.append(item)
+
+        if (
+            len(self.buffer) >= self.controller.batch_size
+            or time.monotonic() - self.oldest >= self.controller.flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+
+        batch = self.buffer
+        self.buffer = []
+        start = time.perf_counter()
+        try:
+            self.flush_func(batch)
+        except Exception:
+            self.buffer = batch + self.buffer
+            self.controller.fail()
+            raise
+        self.controller.observe(len(batch), time.perf_counter() - start)
+
+        self.flushes += 1
+        self.items += len(batch)
+        sampled.info("batch", "%s batching: %s", self.name, self.controller.metrics())  # noqa: E501
+
+    def discard(self) -> None:
+        """
+        Drop the buffered items without flushing them.
+        """
+        self.buffer = []
+
+    def metrics(self) -> dict:
+        return {
+            "flushes": self.flushes,
+            "items": self.items,
+            **self.controller.metrics(),
+        }
+
+    def log_metrics(self) -> None:
+        logger.info(f"{self.name} batching: {self.metrics()}")
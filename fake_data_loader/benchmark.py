@@ -0,0 +1,463 @@
+import contextlib
+import itertools
+import json
+import platform
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+from eligibility import EligibilityTracker
+from event_generator import EventGenerator
+from exceptions import BenchmarkRegression, EventFailedValidation
+from logger import logger
+from targets import FirehoseTarget, PostgresTarget, S3Target, SQLiteTarget
+
+
+# Credentials handed to the AWS targets when they run against moto.
+MOCK_AWS_CREDENTIALS = {
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_REGION": "us-east-1",
+    "BUCKET_NAME": "fake-data-loader-benchmark",
+    "STREAM_NAME": "fake-data-loader-benchmark",
+    "FIREHOSE_TARGET_BUCKET_NAME": "fake-data-loader-benchmark-firehose",
+}
+
+# Number of operations replayed under tracemalloc to measure peak memory.
+MEMORY_SAMPLE_OPS = 1000
+
+# SQLite commits every this many events in the sqlite cases, well above
+# the default, which keeps the write lock short for concurrent readers.
+SQLITE_BENCHMARK_BATCH_SIZE = 10000
+
+# Payloads pre-generated for the sign ups replayed by `sqlite-target`.
+SIGN_UP_SAMPLE_PAYLOADS = 5000
+
+SEED_USERS_SQL = """
+    INSERT INTO users (first_name, last_name, email, dob, state, modified_at, created_at)
+    SELECT 'bench', 'user' || g, 'user' || g || '@example.com', DATE '1980-01-01', 'NY', now(), now()
+    FROM generate_series(1, %s) AS g;
+"""  # noqa: E501
+
+# Every fifth user has no application, a quarter of the rest are pending
+# and the others are approved with a non-zero balance.
+SEED_APPLICATIONS_SQL = """
+    INSERT INTO applications (user_id, status, modified_at, created_at)
+    SELECT id, CASE WHEN rn % 4 = 0 THEN 'pending' ELSE 'approved' END, now(), now()
+    FROM (SELECT id, row_number() OVER (ORDER BY email) AS rn FROM users) AS u
+    WHERE rn % 5 <> 0;
+"""  # noqa: E501
+
+SEED_BALANCES_SQL = """
+    INSERT INTO balances (user_id, amount, modified_at, created_at)
+    SELECT user_id, 100.00, now(), now()
+    FROM applications
+    WHERE status = 'approved';
+"""
+
+# SQLite equivalents of the seed statements above, with amounts in cents.
+SQLITE_SEED_USERS_SQL = """
+    WITH RECURSIVE g(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM g WHERE n < ?)
+    INSERT INTO users (id, first_name, last_name, email, dob, state, modified_at, created_at)
+    SELECT lower(hex(randomblob(16))), 'bench', 'user' || n, 'user' || n || '@example.com', '1980-01-01', 'NY', datetime('now'), datetime('now')
+    FROM g;
+"""  # noqa: E501
+
+SQLITE_SEED_APPLICATIONS_SQL = """
+    INSERT INTO applications (id, user_id, status, modified_at, created_at)
+    SELECT lower(hex(randomblob(16))), id, CASE WHEN rowid % 4 = 0 THEN 'pending' ELSE 'approved' END, datetime('now'), datetime('now')
+    FROM users
+    WHERE rowid % 5 <> 0;
+"""  # noqa: E501
+
+SQLITE_SEED_BALANCES_SQL = """
+    INSERT INTO balances (id, user_id, amount, modified_at, created_at)
+    SELECT lower(hex(randomblob(16))), user_id, 10000, datetime('now'), datetime('now')
+    FROM applications
+    WHERE status = 'approved';
+"""  # noqa: E501
+
+
+def synthetic_validation(event: str, rng: random.Random) -> dict | bool:
+    """
+    Stand-in for `PostgresTarget.validate_event` so the generator can be
+    measured without a database.
+    """
+    if event == "user sign up":
+        return True
+
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "user_id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "state": "NY",
+        "amount": 100,
+    }
+
+
+def synthetic_payloads(count: int, seed: int) -> list[dict]:
+    """
+    Pre-generate payloads so sink benchmarks do not measure the generator.
+    """
+    rng = random.Random(seed)
+    event_generator = EventGenerator(seed=seed)
+    payloads = []
+    for _ in range(count):
+        event = event_generator.get_event()
+        payloads.append(
+            event_generator.generate_event_payload(
+                event,
+                synthetic_validation(event, rng)
+            )
+        )
+
+    return payloads
+
+
+class Benchmark:
+    """
+    Run benchmark cases for a fixed duration each and collect throughput,
+    latency percentiles and peak memory.
+    """
+    def __init__(self, duration: float, seed: int) -> None:
+        self.duration = duration
+        self.seed = seed
+        self.results = {}
+
+    def run_case(self, name: str, op) -> dict:
+        """
+        Call `op` repeatedly for `duration` seconds.
+
+        `op` returns False for an iteration that did no useful work (e.g.
+        an event that failed validation); those count towards latency but
+        not throughput.
+        """
+        clock = time.perf_counter_ns
+        latencies = []
+        completed = 0
+
+        deadline = time.perf_counter() + self.duration
+        started = clock()
+        while time.perf_counter() < deadline:
+            start = clock()
+            done = op()
+            latencies.append(clock() - start)
+            if done is not False:
+                completed += 1
+        elapsed = (clock() - started) / 1e9
+
+        tracemalloc.start()
+        for _ in range(min(len(latencies), MEMORY_SAMPLE_OPS)):
+            op()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if len(latencies) > 1:
+            percentiles = statistics.quantiles(latencies, n=100)
+            p50, p99 = percentiles[49], percentiles[98]
+        else:
+            p50 = p99 = latencies[0] if latencies else 0
+
+        result = {
+            "ops": completed,
+            "iterations": len(latencies),
+            "elapsed_s": elapsed,
+            "throughput": completed / elapsed if elapsed else 0.0,
+            "p50_us": p50 / 1e3,
+            "p99_us": p99 / 1e3,
+            "peak_memory_bytes": peak,
+        }
+        self.results[name] = result
+        logger.info(
+            "%-28s %10.1f ops/s  p50=%9.1fus  p99=%9.1fus  peak=%7.1f KiB",
+            name,
+            result["throughput"],
+            result["p50_us"],
+            result["p99_us"],
+            peak / 1024
+        )
+
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            "seed": self.seed,
+            "duration_s": self.duration,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cases": self.results,
+        }
+
+    def write(self, path: Path) -> None:
+        """
+        Write results as JSON.
+        """
+        with path.open("w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, indent=2)
+        logger.info(f"Benchmark results written to {path}")
+
+    def compare(
+        self,
+        baseline_path: Path,
+        tolerance: float,
+        allow_missing: bool = False
+    ) -> None:
+        """
+        Raise BenchmarkRegression if any case's throughput dropped more
+        than `tolerance` below the stored baseline, or if a baseline case
+        did not run, unless `allow_missing` is set.
+        """
+        with baseline_path.open("r", encoding="utf-8") as file:
+            baseline = json.load(file)["cases"]
+
+        regressions = {}
+        for name, result in self.results.items():
+            if name not in baseline:
+                logger.warning(f"No baseline for benchmark case {name}")
+                continue
+
+            expected = baseline[name]["throughput"]
+            if result["throughput"] < expected * (1 - tolerance):
+                regressions[name] = (expected, result["throughput"])
+
+        missing = [name for name in baseline if name not in self.results]
+        for name in missing:
+            if allow_missing:
+                logger.warning(f"Baseline case {name} did not run")
+            else:
+                regressions[name] = (baseline[name]["throughput"], None)
+
+        if regressions:
+            details = ", ".join(
+                f"{name}: {expected:.1f} ops/s -> did not run"
+                if actual is None
+                else f"{name}: {expected:.1f} -> {actual:.1f} ops/s"
+                for name, (expected, actual) in regressions.items()
+            )
+            raise BenchmarkRegression(
+                f"Throughput regressed more than {tolerance:.0%} or cases are missing: {details}",  # noqa: E501
+                regressions
+            )
+
+
+def _generator_op(event_generator: EventGenerator, rng: random.Random):
+    def op():
+        event = event_generator.get_event()
+        event_generator.generate_event_payload(
+            event,
+            synthetic_validation(event, rng)
+        )
+
+    return op
+
+
+def _postgres_op(event_generator: EventGenerator, postgres_target: PostgresTarget, sinks: list):  # noqa: E501
+    def op():
+        event = event_generator.get_event()
+        try:
+            validation = postgres_target.validate_event(event)
+        except EventFailedValidation:
+            return False
+
+        payload = event_generator.generate_event_payload(event, validation)
+        postgres_target.insert_event(payload)
+        event_generator.record(payload, validation)
+        for sink in sinks:
+            sink.write_event(payload)
+
+    return op
+
+
+def _sqlite_target_op(event_generator: EventGenerator, sqlite_target: SQLiteTarget, sign_ups: list[dict]):  # noqa: E501
+    """
+    Like `_postgres_op`, but sign ups replay pre-generated payloads so
+    the case measures the target rather than Faker.
+    """
+    cycle = itertools.cycle(sign_ups)
+
+    def op():
+        event = event_generator.get_event()
+        try:
+            validation = sqlite_target.validate_event(event)
+        except EventFailedValidation:
+            return False
+
+        if event == "user sign up":
+            payload = next(cycle)
+        else:
+            payload = event_generator.generate_event_payload(event, validation)  # noqa: E501
+        sqlite_target.insert_event(payload)
+        event_generator.record(payload, validation)
+
+    return op
+
+
+def _stateful_generator(seed: int, postgres_target: PostgresTarget) -> EventGenerator:  # noqa: E501
+    return EventGenerator(
+        seed=seed,
+        eligibility=EligibilityTracker(postgres_target.eligibility_counts())
+    )
+
+
+def _sink_op(sink, payloads: list[dict]):
+    cycle = itertools.cycle(payloads)
+
+    def op():
+        sink.write_event(next(cycle))
+
+    return op
+
+
+def prepare_postgres(postgres_target: PostgresTarget, table_size: int, seed: int) -> None:  # noqa: E501
+    """
+    Recreate the tables, seed them with `table_size` users and seed the
+    target's row picks with `seed`.
+    """
+    postgres_target.create_tables(recreate=True)
+    postgres_target.set_seed(seed)
+    if table_size:
+        postgres_target.cursor.execute(SEED_USERS_SQL, (table_size,))
+        postgres_target.cursor.execute(SEED_APPLICATIONS_SQL)
+        postgres_target.cursor.execute(SEED_BALANCES_SQL)
+        postgres_target.cursor.execute("ANALYZE;")
+
+
+def prepare_sqlite(sqlite_target: SQLiteTarget, table_size: int, seed: int) -> None:  # noqa: E501
+    """
+    Recreate the SQLite tables, seed them with `table_size` users and
+    seed the target's row picks with `seed`.
+    """
+    sqlite_target.create_tables(recreate=True)
+    sqlite_target.set_seed(seed)
+    if table_size:
+        sqlite_target.cursor.execute(SQLITE_SEED_USERS_SQL, (table_size,))
+        sqlite_target.cursor.execute(SQLITE_SEED_APPLICATIONS_SQL)
+        sqlite_target.cursor.execute(SQLITE_SEED_BALANCES_SQL)
+        sqlite_target.connection.commit()
+        sqlite_target.cursor.execute("ANALYZE;")
+
+
+@contextlib.contextmanager
+def mock_aws_targets():
+    """
+    Yield S3 and Firehose targets backed by moto, or None when moto is
+    not installed.
+    """
+    try:
+        import boto3
+        from moto import mock_aws
+    except ImportError:
+        logger.warning(
+            "moto is not installed, skipping S3 and Firehose benchmarks. "
+            "Install it with `pip install 'moto[s3,firehose]'`."
+        )
+        yield None
+        return
+
+    credentials = MOCK_AWS_CREDENTIALS
+    with mock_aws():
+        s3 = boto3.client("s3", region_name=credentials["AWS_REGION"])
+        s3.create_bucket(Bucket=credentials["BUCKET_NAME"])
+        s3.create_bucket(Bucket=credentials["FIREHOSE_TARGET_BUCKET_NAME"])
+        boto3.client(
+            "firehose",
+            region_name=credentials["AWS_REGION"]
+        ).create_delivery_stream(
+            DeliveryStreamName=credentials["STREAM_NAME"],
+            ExtendedS3DestinationConfiguration={
+                "RoleARN": "arn:aws:iam::123456789012:role/firehose",
+                "BucketARN": f"arn:aws:s3:::{credentials['FIREHOSE_TARGET_BUCKET_NAME']}",  # noqa: E501
+            }
+        )
+
+        yield {
+            "s3": S3Target(credentials),
+            "firehose": FirehoseTarget(credentials),
+        }
+
+
+def run_benchmarks(
+    benchmark: Benchmark,
+    cases: tuple[str, ...],
+    table_sizes: list[int],
+    postgres_credentials: dict | None
+) -> None:
+    """
+    Run the selected cases: `generator`, `s3`, `firehose` in isolation,
+    `postgres`, `sqlite` and `sqlite-target` (sqlite without the cost of
+    generating sign ups) per table size and `e2e` (postgres plus each AWS
+    sink).
+    """
+    seed = benchmark.seed
+
+    if "sqlite" in cases or "sqlite-target" in cases:
+        sign_ups = [
+            payload
+            for payload in synthetic_payloads(SIGN_UP_SAMPLE_PAYLOADS, seed)
+            if payload["event"] == "user sign up"
+        ]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sqlite_target = SQLiteTarget({
+                "SQLITE_PATH": f"{temp_dir}/benchmark.db",
+                "SQLITE_BATCH_SIZE": SQLITE_BENCHMARK_BATCH_SIZE,
+            })
+            try:
+                for table_size in table_sizes:
+                    if "sqlite" in cases:
+                        prepare_sqlite(sqlite_target, table_size, seed)
+                        benchmark.run_case(
+                            f"sqlite:{table_size}",
+                            _postgres_op(_stateful_generator(seed, sqlite_target), sqlite_target, [])  # noqa: E501
+                        )
+
+                    if "sqlite-target" in cases:
+                        prepare_sqlite(sqlite_target, table_size, seed)
+                        benchmark.run_case(
+                            f"sqlite-target:{table_size}",
+                            _sqlite_target_op(_stateful_generator(seed, sqlite_target), sqlite_target, sign_ups)  # noqa: E501
+                        )
+            finally:
+                sqlite_target.close_connection()
+
+    if "generator" in cases:
+        benchmark.run_case(
+            "generator",
+            _generator_op(EventGenerator(seed=seed), random.Random(seed))
+        )
+
+    with mock_aws_targets() as aws_targets:
+        if aws_targets:
+            payloads = synthetic_payloads(1000, seed)
+            for name in ("s3", "firehose"):
+                if name in cases:
+                    benchmark.run_case(name, _sink_op(aws_targets[name], payloads))  # noqa: E501
+
+        wants_postgres = "postgres" in cases or "e2e" in cases
+        if wants_postgres and postgres_credentials is None:
+            logger.warning("No --config-path given, skipping Postgres benchmarks.")  # noqa: E501
+            return
+        if not wants_postgres:
+            return
+
+        postgres_target = PostgresTarget(postgres_credentials)
+        try:
+            for table_size in table_sizes:
+                if "postgres" in cases:
+                    prepare_postgres(postgres_target, table_size, seed)
+                    benchmark.run_case(
+                        f"postgres:{table_size}",
+                        _postgres_op(_stateful_generator(seed, postgres_target), postgres_target, [])  # noqa: E501
+                    )
+
+                if "e2e" in cases and aws_targets:
+                    for name, sink in aws_targets.items():
+                        prepare_postgres(postgres_target, table_size, seed)
+                        benchmark.run_case(
+                            f"e2e:{name}:{table_size}",
+                            _postgres_op(_stateful_generator(seed, postgres_target), postgres_target, [sink])  # noqa: E501
+                        )
+        finally:
+            postgres_target.close_connection()
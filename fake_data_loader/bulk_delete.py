@@ -0,0 +1,193 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from logger import logger
+
+
+# S3 accepts at most 1,000 keys per DeleteObjects call.
+DELETE_BATCH_SIZE = 1000
+
+
+class BulkDeleter:
+    """
+    Delete every object version and delete marker under `prefix`.
+
+    The prefix is first expanded `shard_depth` levels down its `/`
+    delimited hierarchy (e.g. `events/` -> `events/YYYY/MM/DD/`), then each
+    shard is listed by its own paginator. Listed pages are queued as
+    1,000-key `delete_objects` batches for a pool of delete workers, and
+    keys that come back in the response's `Errors` are retried with
+    backoff.
+    """
+    def __init__(
+        self,
+        client,
+        bucket_name: str,
+        prefix: str = "",
+        workers: int = 16,
+        list_workers: int = 8,
+        shard_depth: int = 3,
+        max_retries: int = 5,
+        progress_interval: float = 5.0
+    ) -> None:
+        self.client = client
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.workers = workers
+        self.list_workers = list_workers
+        self.shard_depth = shard_depth
+        self.max_retries = max_retries
+        self.progress_interval = progress_interval
+
+        self.deleted = 0
+        self.failed = []
+        self._lock = threading.Lock()
+        self._batches = queue.Queue(maxsize=workers * 4)
+
+    def _list_level(self, prefix: str) -> list[str]:
+        """
+        Queue the versions stored directly under `prefix` and return its
+        child prefixes.
+        """
+        children = []
+        paginator = self.client.get_paginator("list_object_versions")
+        for page in paginator.paginate(
+            Bucket=self.bucket_name,
+            Prefix=prefix,
+            Delimiter="/"
+        ):
+            self._queue_page(page)
+            children.extend(
+                common["Prefix"] for common in page.get("CommonPrefixes", [])
+            )
+
+        return children
+
+    def _list_shard(self, prefix: str) -> None:
+        """
+        Queue every version under `prefix`.
+        """
+        paginator = self.client.get_paginator("list_object_versions")
+        for page in paginator.paginate(
+            Bucket=self.bucket_name,
+            Prefix=prefix,
+            PaginationConfig={"PageSize": DELETE_BATCH_SIZE}
+        ):
+            self._queue_page(page)
+
+    def _queue_page(self, page: dict) -> None:
+        objects = [
+            {"Key": item["Key"], "VersionId": item["VersionId"]}
+            for item in page.get("Versions", []) + page.get("DeleteMarkers", [])  # noqa: E501
+        ]
+        for start in range(0, len(objects), DELETE_BATCH_SIZE):
+            self._batches.put(objects[start:start + DELETE_BATCH_SIZE])
+
+    def _delete_batch(self, objects: list[dict]) -> None:
+        """
+        Delete one batch, retrying the keys that failed.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.client.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={"Objects": objects, "Quiet": True}
+                )
+                errors = response.get("Errors", [])
+            except (BotoCoreError, ClientError) as err:
+                logger.warning(f"delete_objects failed, retrying: {err}")
+                errors = [{**item, "Code": type(err).__name__} for item in objects]  # noqa: E501
+
+            with self._lock:
+                self.deleted += len(objects) - len(errors)
+
+            if not errors:
+                return
+
+            objects = [
+                {"Key": error["Key"], "VersionId": error["VersionId"]}
+                for error in errors
+            ]
+            if attempt < self.max_retries:
+                time.sleep(min(0.1 * 2 ** attempt, 5.0))
+
+        logger.error(f"Giving up on {len(objects)} keys after {self.max_retries} retries")  # noqa: E501
+        with self._lock:
+            self.failed.extend(objects)
+
+    def _delete_worker(self) -> None:
+        while True:
+            objects = self._batches.get()
+            if objects is None:
+                return
+            self._delete_batch(objects)
+
+    def _report_progress(self, started: float, done: threading.Event) -> None:
+        while not done.wait(self.progress_interval):
+            elapsed = time.perf_counter() - started
+            logger.info(
+                "Deleted %d objects from %s/%s (%.0f objects/s)",
+                self.deleted,
+                self.bucket_name,
+                self.prefix,
+                self.deleted / elapsed
+            )
+
+    def run(self) -> dict:
+        """
+        Delete everything under the prefix and return the run statistics.
+        """
+        started = time.perf_counter()
+        done = threading.Event()
+
+        deleters = [
+            threading.Thread(target=self._delete_worker, daemon=True)
+            for _ in range(self.workers)
+        ]
+        reporter = threading.Thread(
+            target=self._report_progress,
+            args=(started, done),
+            daemon=True
+        )
+        for thread in deleters + [reporter]:
+            thread.start()
+
+        try:
+            shards = [self.prefix]
+            for _ in range(self.shard_depth):
+                with ThreadPoolExecutor(self.list_workers) as executor:
+                    levels = list(executor.map(self._list_level, shards))
+                shards = [child for children in levels for child in children]
+
+            with ThreadPoolExecutor(self.list_workers) as executor:
+                list(executor.map(self._list_shard, shards))
+        finally:
+            for _ in deleters:
+                self._batches.put(None)
+            for thread in deleters:
+                thread.join()
+            done.set()
+            reporter.join()
+
+        elapsed = time.perf_counter() - started
+        stats = {
+            "deleted": self.deleted,
+            "failed": len(self.failed),
+            "elapsed_s": elapsed,
+            "throughput": self.deleted / elapsed if elapsed else 0.0,
+        }
+        logger.info(
+            "Emptied %s/%s: %d objects deleted, %d failed in %.1fs (%.0f objects/s)",  # noqa: E501
+            self.bucket_name,
+            self.prefix,
+            stats["deleted"],
+            stats["failed"],
+            elapsed,
+            stats["throughput"]
+        )
+
+        return stats
@@ -0,0 +1,71 @@
+from logger import sampled
+
+
+class CdcEmitter:
+    """
+    Turn row changes into change records and write them to sinks in
+    batches.
+
+    Each call to `commit` is one transaction: its changes share a `txid`,
+    get consecutive `lsn` values and are never split across batches. A
+    batch is flushed once it holds at least `batch_size` records.
+
+    Record layout (Debezium-like):
+        lsn         -- monotonically increasing change sequence number
+        txid        -- transaction id, one per applied event
+        commit_lsn  -- lsn of the transaction's last change
+        table       -- source table
+        op          -- "c" for insert, "u" for update
+        event_ts    -- commit timestamp
+        before      -- row image before the change, None for inserts
+        after       -- row image after the change
+    """
+    def __init__(self, sinks: list, batch_size: int = 500) -> None:
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.lsn = 0
+        self.txid = 0
+        self.buffer = []
+
+    def commit(self, changes: list[tuple], event_ts: str) -> None:
+        """
+        Append one transaction's `(table, op, before, after)` changes.
+        """
+        if not changes:
+            return
+
+        self.txid += 1
+        commit_lsn = self.lsn + len(changes)
+        for table, op, before, after in changes:
+            self.lsn += 1
+            self.buffer.append({
+                "lsn": self.lsn,
+                "txid": self.txid,
+                "commit_lsn": commit_lsn,
+                "table": table,
+                "op": op,
+                "event_ts": event_ts,
+                "before": before,
+                "after": after,
+            })
+
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the buffered records to every sink.
+        """
+        if not self.buffer:
+            return
+
+        batch_id = f"{self.buffer[0]['lsn']:016x}"
+        for sink in self.sinks:
+            sink.write_batch(self.buffer, batch_id)
+        sampled.info(
+            "write",
+            "Flushed %d change records up to lsn %d",
+            len(self.buffer),
+            self.lsn
+        )
+        self.buffer = []
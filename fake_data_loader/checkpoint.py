@@ -0,0 +1,134 @@
+import json
+import os
+import time
+from pathlib import Path
+
+from exceptions import CheckpointError
+from logger import logger
+
+
+class Checkpointer:
+    """
+    Persist stream state to a small JSON file.
+
+    Every save writes `<path>.tmp`, fsyncs it, renames it over `path` and
+    fsyncs the directory, so the file on disk is always a complete
+    checkpoint. When a `commit` callback is given it runs between the
+    fsync and the rename. The callback commits the Postgres transaction
+    together with the checkpoint position, so on resume the position
+    stored in Postgres picks whichever of the two files matches what was
+    committed.
+
+    The payloads of the latest checkpoint are kept in `<path>.spool`, one
+    JSON line each, until every sink has acknowledged them. The
+    checkpoint only records how many are spooled and how far each sink
+    has read, so its size does not grow with the event rate.
+
+    A checkpoint is due every `interval` seconds or once `max_events`
+    payloads are waiting, whichever comes first. That bounds how long the
+    sinks lag behind the target.
+    """
+    def __init__(
+        self,
+        path: Path,
+        interval: float = 1.0,
+        max_events: int = 10000
+    ) -> None:
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".tmp")
+        self.spool_path = path.with_name(path.name + ".spool")
+        self.interval = interval
+        self.max_events = max_events
+        self.last_saved = time.monotonic()
+
+    @property
+    def name(self) -> str:
+        """
+        Key the checkpoint position is stored under in the target.
+        """
+        return str(self.path.resolve())
+
+    def due(self, pending: int) -> bool:
+        return (
+            pending >= self.max_events
+            or time.monotonic() - self.last_saved >= self.interval
+        )
+
+    def _fsync_directory(self) -> None:
+        """
+        Make renames and newly created files in the checkpoint directory
+        durable.
+        """
+        descriptor = os.open(self.path.parent, os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def spool(self, payloads: list[dict]) -> None:
+        """
+        Replace the spool with `payloads` and fsync it. The previous
+        spool must have been acknowledged by every sink.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        created = not self.spool_path.exists()
+        with self.spool_path.open("w", encoding="utf-8") as file:
+            for payload in payloads:
+                file.write(json.dumps(payload, default=str) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+        if created:
+            self._fsync_directory()
+
+    def read_spool(self, skip: int = 0):
+        """
+        Yield the spooled payloads after the first `skip`.
+        """
+        with self.spool_path.open("r", encoding="utf-8") as file:
+            for index, line in enumerate(file):
+                if index >= skip:
+                    yield json.loads(line)
+
+    def save(self, state: dict, commit=None) -> None:
+        """
+        Atomically replace the checkpoint with `state`.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.tmp_path.open("w", encoding="utf-8") as file:
+            json.dump(state, file, default=str)
+            file.flush()
+            os.fsync(file.fileno())
+
+        if commit is not None:
+            commit(state["position"])
+
+        os.replace(self.tmp_path, self.path)
+        self._fsync_directory()
+        self.last_saved = time.monotonic()
+
+    def load(self, committed_position: int | None) -> dict:
+        """
+        Load the checkpoint matching the position committed to the target.
+        """
+        for path in (self.tmp_path, self.path):
+            if not path.exists():
+                continue
+
+            try:
+                with path.open("r", encoding="utf-8") as file:
+                    state = json.load(file)
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring incomplete checkpoint {path}")
+                continue
+
+            if state["position"] == committed_position:
+                if path == self.tmp_path:
+                    os.replace(self.tmp_path, self.path)
+                    self._fsync_directory()
+                logger.info(f"Resuming from checkpoint at event {state['position']}")  # noqa: E501
+                return state
+
+        raise CheckpointError(
+            f"No checkpoint at {self.path} matches committed position {committed_position}"  # noqa: E501
+        )
@@ -1,164 +1,716 @@
-import time
+import json
+import os
 from pathlib import Path
 
 import click
 
 from auth_handler import AuthHandler
+from batching import AimdController
+from benchmark import Benchmark, run_benchmarks
+from cdc import CdcEmitter
+from checkpoint import Checkpointer
+from coordinator import Coordinator, CoordinatorClient
+from eligibility import EligibilityTracker
 from event_generator import EventGenerator
-from exceptions import EventFailedValidation
-from logger import logger
-from targets import PostgresTarget, S3Target, FirehoseTarget
+from exceptions import BenchmarkRegression, CheckpointError, CoordinatorError, VerificationFailed  # noqa: E501
+from logger import configure_logging, logger, parse_sample_rates
+from profiler import Profiler
+from stream import StreamRunner
+from targets import FirehoseTarget, LocalTarget, MemoryTarget, PostgresTarget, S3Target, SQLiteTarget  # noqa: E501
+from verify import LocalEventLog, S3EventLog, Verifier
 
 
 @click.group()
+@click.option(
+    "--log-level",
+    required=False,
+    default="INFO",
+    type=click.Choice(["DEBUG", "INFO", "WARNING", "ERROR"], case_sensitive=False),  # noqa: E501
+    help="Minimum level of log records to emit."
+)
+@click.option(
+    "--log-sample",
+    required=False,
+    multiple=True,
+    help="Log 1-in-N records of a hot-path category, e.g. payload=10000. "
+         "Categories: event, payload, query, write, validation, batch."
+)
+@click.option(
+    "--log-json",
+    is_flag=True,
+    default=False,
+    help="Emit log records as JSON lines."
+)
 @click.pass_context
-def cli(ctx: dict) -> None:
+def cli(ctx: dict, log_level: str, log_sample: tuple, log_json: bool) -> None:
     """CLI tool to manage database tables."""
     ctx.ensure_object(dict)
 
+    try:
+        sample_rates = parse_sample_rates(log_sample)
+    except ValueError as err:
+        raise click.BadParameter(str(err), param_hint="--log-sample")
+
+    configure_logging(
+        level=log_level,
+        sample_rates=sample_rates,
+        json_output=log_json
+    )
+
+
+CDC_SINKS = {
+    "s3": S3Target,
+    "firehose": FirehoseTarget,
+    "local": LocalTarget,
+}
+
+
+def stream_options(func):
+    """
+    Options shared by every stream command.
+    """
+    options = [
+        click.option(
+            "--config-path",
+            "-c",
+            required=True,
+            help="Path of the config file containing the postgres credentials."
+        ),
+        click.option(
+            "--recreate",
+            "-r",
+            is_flag=True,
+            default=False,
+            help="Flag to recreate the tables before starting the stream."
+        ),
+        click.option(
+            "--event-lag",
+            "-e",
+            required=False,
+            default="1",
+            help="Time in seconds to wait between generating events."
+        ),
+        click.option(
+            "--duration",
+            "-d",
+            required=False,
+            default="60",
+            help="Time in seconds to run the stream."
+        ),
+        click.option(
+            "--seed",
+            required=False,
+            default=None,
+            type=int,
+            help="Root seed for all generated data. Runs with the same seed "
+                 "and table state produce the same payload stream."
+        ),
+        click.option(
+            "--eligibility/--no-eligibility",
+            default=True,
+            help="Only pick events that are valid against live entity "
+                 "counts instead of discarding events that fail validation."
+        ),
+        click.option(
+            "--adaptive-batching",
+            is_flag=True,
+            default=False,
+            help="Batch Postgres and sink writes, tuning batch size and "
+                 "flush interval from observed write latency."
+        ),
+        click.option(
+            "--batch-goal",
+            required=False,
+            default="latency",
+            type=click.Choice(["latency", "throughput"]),
+            help="Keep p99 flush latency under --batch-p99, or maximize "
+                 "throughput."
+        ),
+        click.option(
+            "--batch-p99",
+            required=False,
+            default=0.25,
+            type=float,
+            help="Target p99 latency in seconds for the latency goal."
+        ),
+        click.option(
+            "--max-batch-size",
+            required=False,
+            default=1000,
+            type=int,
+            help="Upper bound for the adaptive batch size."
+        ),
+        click.option(
+            "--checkpoint-path",
+            required=False,
+            default=None,
+            help="File to checkpoint the stream to. Postgres is then only "
+                 "committed at checkpoints."
+        ),
+        click.option(
+            "--checkpoint-interval",
+            required=False,
+            default=1.0,
+            type=float,
+            help="Seconds between checkpoints. Sinks receive the events of "
+                 "a checkpoint once it is committed."
+        ),
+        click.option(
+            "--checkpoint-events",
+            required=False,
+            default=10000,
+            type=click.IntRange(min=1),
+            help="Checkpoint early once this many events are waiting for "
+                 "the next checkpoint."
+        ),
+        click.option(
+            "--resume",
+            is_flag=True,
+            default=False,
+            help="Continue from the last checkpoint in --checkpoint-path."
+        ),
+        click.option(
+            "--cdc-sink",
+            "cdc_sinks",
+            required=False,
+            multiple=True,
+            type=click.Choice(list(CDC_SINKS)),
+            help="Also emit row-level change records of the applied events "
+                 "to this sink, may be repeated."
+        ),
+        click.option(
+            "--cdc-batch-size",
+            required=False,
+            default=500,
+            type=int,
+            help="Minimum number of change records per --cdc-sink write."
+        ),
+        click.option(
+            "--cdc-prefix",
+            required=False,
+            default="cdc/",
+            help="Key prefix of the --cdc-sink change record batches."
+        ),
+        click.option(
+            "--coordinator",
+            required=False,
+            default=None,
+            help="Address (host:port or Unix socket path) of a coordinator "
+                 "to lease a user shard and rate tokens from."
+        ),
+        click.option(
+            "--profile",
+            required=False,
+            default=None,
+            type=click.Choice(["sampling", "deterministic"]),
+            help="Profile the stream loop. `sampling` records per-stage time "
+                 "and folded stacks; `deterministic` also writes cProfile "
+                 "pstats."
+        ),
+        click.option(
+            "--profile-dir",
+            required=False,
+            default="profile",
+            help="Directory the profile reports are written to."
+        ),
+        click.option(
+            "--profile-memory-interval",
+            required=False,
+            default=None,
+            type=float,
+            help="Seconds between tracemalloc snapshots while profiling."
+        ),
+    ]
+    for option in reversed(options):
+        func = option(func)
+
+    return func
+
+
+def _run_stream(options: dict, target, sinks: list) -> None:
+    """
+    Run the event loop against `target`, writing payloads to `sinks`.
+    """
+    checkpointer = None
+    if options["checkpoint_path"]:
+        checkpointer = Checkpointer(
+            Path(options["checkpoint_path"]),
+            interval=options["checkpoint_interval"],
+            max_events=options["checkpoint_events"]
+        )
+    if options["resume"] and checkpointer is None:
+        raise click.UsageError("--resume requires --checkpoint-path.")
+    if options["resume"] and options["recreate"]:
+        raise click.UsageError("--resume cannot be combined with --recreate.")  # noqa: E501
+    if options["coordinator"] and options["recreate"]:
+        raise click.UsageError(
+            "--recreate cannot be combined with --coordinator, create the "
+            "tables before starting the nodes."
+        )
+
+    target.create_tables(recreate=options["recreate"])
+
+    state = None
+    if checkpointer is not None:
+        target.enable_checkpoints()
+        if options["resume"]:
+            try:
+                state = checkpointer.load(
+                    target.committed_position(checkpointer.name)
+                )
+            except CheckpointError as err:
+                raise click.ClickException(err.message)
+
+    shard = None if state is None else state.get("shard")
+    if shard is not None and not options["coordinator"]:
+        raise click.UsageError("The checkpoint was taken with a shard lease, resume it with --coordinator.")  # noqa: E501
+
+    coordinator = None
+    stream, streams = 0, 1
+    if options["coordinator"]:
+        try:
+            coordinator = CoordinatorClient(options["coordinator"])
+            coordinator.lease(shard)
+            target.set_shard(coordinator.shard, coordinator.shards)
+        except CoordinatorError as err:
+            raise click.ClickException(err.message)
+        stream, streams = coordinator.shard, coordinator.shards
+
+    eligibility = None
+    if options["eligibility"]:
+        # On resume the counts come from the checkpoint instead of a scan.
+        eligibility = EligibilityTracker(
+            target.eligibility_counts() if state is None else None
+        )
+    event_generator = EventGenerator(
+        seed=options["seed"],
+        stream=stream,
+        streams=streams,
+        eligibility=eligibility
+    )
+
+    if options["seed"] is not None:
+        position = 0 if state is None else state["position"]
+        seed_path = (position,) if coordinator is None else (stream, position)  # noqa: E501
+        target.set_seed(options["seed"], *seed_path)
+    if options["recreate"]:
+        for sink in sinks:
+            sink.empty_bucket()
+
+    if options["adaptive_batching"]:
+        for batched in [target, *sinks]:
+            batched.enable_batching(
+                AimdController(
+                    goal=options["batch_goal"],
+                    target_p99=options["batch_p99"],
+                    max_batch=options["max_batch_size"]
+                )
+            )
+
+    profiler = None
+    if options["profile"]:
+        profiler = Profiler(
+            Path(options["profile_dir"]),
+            mode=options["profile"],
+            memory_interval=options["profile_memory_interval"]
+        )
+
+    runner = StreamRunner(
+        event_generator,
+        target,
+        sinks,
+        profiler=profiler,
+        checkpointer=checkpointer,
+        coordinator=coordinator
+    )
+    if state is not None:
+        runner.restore(state)
+
+    try:
+        runner.run(int(options["duration"]), float(options["event_lag"]))
+    except CoordinatorError as err:
+        raise click.ClickException(err.message)
+    finally:
+        target.close_connection()
+        if coordinator is not None:
+            try:
+                coordinator.release(runner.progress())
+            except CoordinatorError as err:
+                logger.warning(f"Could not release shard {coordinator.shard}: {err.message}")  # noqa: E501
+            coordinator.close()
+
+
+def _cdc_emitter(options: dict, credentials: dict) -> CdcEmitter | None:
+    """
+    Change record emitter for --cdc-sink, if any.
+    """
+    if not options["cdc_sinks"]:
+        return None
+    if options["checkpoint_path"]:
+        raise click.UsageError("--cdc-sink does not support checkpoints.")
+
+    sinks = [
+        CDC_SINKS[name](credentials, prefix=options["cdc_prefix"])
+        for name in options["cdc_sinks"]
+    ]
+    if options["recreate"]:
+        for sink in sinks:
+            sink.empty_bucket()
+
+    return CdcEmitter(sinks, batch_size=options["cdc_batch_size"])
+
+
+def _run_postgres_stream(options: dict, sink_classes: list) -> None:
+    """
+    Build the targets for a stream command and run the event loop.
+    """
+    if options["cdc_sinks"] and options["adaptive_batching"]:
+        raise click.UsageError(
+            "--cdc-sink reads every change back from Postgres and cannot "
+            "be combined with --adaptive-batching."
+        )
+    if options["seed"] is not None and options["adaptive_batching"]:
+        raise click.UsageError(
+            "--seed cannot be combined with --adaptive-batching: Postgres "
+            "picks rows from the flushed state, which depends on the batch "
+            "sizes."
+        )
+
+    target_credentials = AuthHandler().convert_to_dict(Path(options["config_path"]))  # noqa: E501
+    postgres_target = PostgresTarget(
+        target_credentials,
+        cdc=_cdc_emitter(options, target_credentials)
+    )
+    sinks = [sink_class(target_credentials) for sink_class in sink_classes]
+
+    _run_stream(options, postgres_target, sinks)
+
+
+@cli.command()
+@stream_options
+@click.pass_context
+def s3_stream(ctx: dict, **options) -> None:
+    """
+    Start streaming events to a target.
+    """
+    _run_postgres_stream(options, [S3Target])
+
 
 @cli.command()
+@stream_options
+@click.pass_context
+def firehose_stream(ctx: dict, **options) -> None:
+    """
+    Start streaming events to a target.
+    """
+    _run_postgres_stream(options, [FirehoseTarget])
+
+
+@cli.command()
+@stream_options
+@click.pass_context
+def pg_stream(ctx: dict, **options) -> None:
+    """
+    Start streaming events to a target.
+    """
+    _run_postgres_stream(options, [])
+
+
+@cli.command()
+@stream_options
+@click.pass_context
+def local_stream(ctx: dict, **options) -> None:
+    """
+    Start streaming events to a local directory (LOCAL_DIR).
+    """
+    _run_postgres_stream(options, [LocalTarget])
+
+
+@cli.command()
+@stream_options
 @click.option(
-    "--config-path",
-    "-c",
+    "--sink",
+    "sink_names",
     required=True,
-    help="Path of the config file containing the postgres credentials."
+    multiple=True,
+    type=click.Choice(list(CDC_SINKS)),
+    help="Sink the change records are written to, may be repeated."
 )
 @click.option(
-    "--recreate",
-    "-r",
-    is_flag=True,
-    default=False,
-    help="Flag to recreate the tables before starting the stream."
-)
-@click.option(
-    "--event-lag",
-    "-e",
+    "--batch-size",
     required=False,
-    default="1",
-    help="Time in seconds to wait between generating events."
+    default=500,
+    type=int,
+    help="Minimum number of change records per sink write."
 )
 @click.option(
-    "--duration",
-    "-d",
+    "--prefix",
     required=False,
-    default="60",
-    help="Time in seconds to run the stream."
+    default="cdc/",
+    help="Key prefix of the change record batches."
 )
 @click.pass_context
-def s3_stream(
+def cdc_stream(
     ctx: dict,
-    config_path: str,
-    recreate: bool,
-    event_lag: str,
-    duration: str
+    sink_names: tuple,
+    batch_size: int,
+    prefix: str,
+    **options
 ) -> None:
     """
-    Start streaming events to a target.
+    Stream row-level change records for the generated events, without
+    Postgres. The tables are kept in memory, about 1 KiB per user, so
+    long runs should use --cdc-sink on sqlite-stream or pg-stream.
     """
-    time_start = time.time()
+    if options["checkpoint_path"] or options["resume"]:
+        raise click.UsageError("cdc-stream does not support checkpoints.")
+    if options["adaptive_batching"]:
+        raise click.UsageError("cdc-stream batches with --batch-size.")
+    if options["cdc_sinks"]:
+        raise click.UsageError("cdc-stream takes its sinks with --sink.")
+    if options["coordinator"]:
+        raise click.UsageError(
+            "cdc-stream keeps its tables in memory and cannot share them "
+            "through --coordinator, use sqlite-stream or pg-stream with "
+            "--cdc-sink."
+        )
+
+    target_credentials = AuthHandler().convert_to_dict(Path(options["config_path"]))  # noqa: E501
+    sinks = [
+        CDC_SINKS[name](target_credentials, prefix=prefix)
+        for name in sink_names
+    ]
+    memory_target = MemoryTarget(cdc=CdcEmitter(sinks, batch_size=batch_size))  # noqa: E501
+    if options["recreate"]:
+        for sink in sinks:
+            sink.empty_bucket()
+
+    _run_stream({**options, "recreate": False}, memory_target, [])
 
-    target_credentials = AuthHandler().convert_to_dict(Path(config_path))
-    postgres_target = PostgresTarget(target_credentials)
-    s3_target = S3Target(target_credentials)
-    event_generator = EventGenerator()
-
-    postgres_target.create_tables(recreate=recreate)
-    if recreate:
-        s3_target.empty_bucket()
-
-    while time.time() - time_start < int(duration):
-        event = event_generator.get_event()
-        logger.info(f"GENERATED EVENT: {event}")
-
-        try:
-            validation = postgres_target.validate_event(event)
-        except EventFailedValidation as err:
-            logger.error(err)
-            continue
-
-        payload = event_generator.generate_event_payload(event, validation)
-        logger.info(f"PAYLOAD: {payload}")
-        postgres_target.insert_event(payload)
-        s3_target.write_event(payload)
 
-        time.sleep(float(event_lag))
-
-    postgres_target.close_connection()
+@cli.command()
+@stream_options
+@click.option(
+    "--database",
+    required=False,
+    default=None,
+    help="SQLite database file, overrides SQLITE_PATH from the config."
+)
+@click.option(
+    "--sink",
+    "sink_names",
+    required=False,
+    multiple=True,
+    type=click.Choice(list(CDC_SINKS)),
+    help="Sink the events are written to, may be repeated."
+)
+@click.pass_context
+def sqlite_stream(
+    ctx: dict,
+    database: str | None,
+    sink_names: tuple,
+    **options
+) -> None:
+    """
+    Start streaming events with an embedded SQLite database in place of
+    Postgres.
+    """
+    target_credentials = AuthHandler().convert_to_dict(Path(options["config_path"]))  # noqa: E501
+    if database:
+        target_credentials["SQLITE_PATH"] = database
+    sqlite_target = SQLiteTarget(
+        target_credentials,
+        cdc=_cdc_emitter(options, target_credentials)
+    )
+    sinks = [CDC_SINKS[name](target_credentials) for name in sink_names]
 
-    return
+    _run_stream(options, sqlite_target, sinks)
 
 
 @cli.command()
 @click.option(
-    "--config-path",
-    "-c",
-    required=True,
-    help="Path of the config file containing the postgres credentials."
+    "--listen",
+    required=False,
+    default="127.0.0.1:7878",
+    help="host:port to listen on, or a Unix socket path."
 )
 @click.option(
-    "--recreate",
-    "-r",
-    is_flag=True,
-    default=False,
-    help="Flag to recreate the tables before starting the stream."
+    "--shards",
+    required=False,
+    default=16,
+    type=int,
+    help="Number of user id shards, the maximum number of nodes."
+)
+@click.option(
+    "--rate",
+    required=False,
+    default=None,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Combined events per second across all nodes. Unlimited by "
+         "default."
+)
+@click.option(
+    "--lease-ttl",
+    required=False,
+    default=30.0,
+    type=float,
+    help="Seconds without a heartbeat before a node's shard can be leased "
+         "to another node."
 )
 @click.option(
-    "--event-lag",
-    "-e",
+    "--report-interval",
     required=False,
-    default="1",
-    help="Time in seconds to wait between generating events."
+    default=5.0,
+    type=float,
+    help="Seconds between aggregated progress logs."
 )
 @click.option(
     "--duration",
     "-d",
     required=False,
-    default="60",
-    help="Time in seconds to run the stream."
+    default=None,
+    type=float,
+    help="Time in seconds to run the coordinator. Runs until interrupted "
+         "by default."
+)
+@click.option(
+    "--output",
+    "-o",
+    required=False,
+    default=None,
+    help="Path the final status JSON is written to."
 )
 @click.pass_context
-def firehose_stream(
+def coordinator(
     ctx: dict,
-    config_path: str,
-    recreate: bool,
-    event_lag: str,
-    duration: str
+    listen: str,
+    shards: int,
+    rate: float | None,
+    lease_ttl: float,
+    report_interval: float,
+    duration: float | None,
+    output: str | None
 ) -> None:
     """
-    Start streaming events to a target.
+    Coordinate stream commands started with --coordinator: lease each a
+    user shard, share one rate budget and aggregate their progress.
     """
-    time_start = time.time()
+    try:
+        server = Coordinator(
+            listen,
+            shards=shards,
+            rate=rate,
+            lease_ttl=lease_ttl,
+            report_interval=report_interval
+        )
+    except ValueError as err:
+        raise click.BadParameter(str(err), param_hint="--shards")
+
+    status = server.run(duration)
+    if output:
+        Path(output).write_text(json.dumps(status, indent=2), encoding="utf-8")  # noqa: E501
 
-    target_credentials = AuthHandler().convert_to_dict(Path(config_path))
-    postgres_target = PostgresTarget(target_credentials)
-    firehose_target = FirehoseTarget(target_credentials)
-    event_generator = EventGenerator()
-
-    postgres_target.create_tables(recreate=recreate)
-    if recreate:
-        firehose_target.empty_bucket()
-
-    while time.time() - time_start < int(duration):
-        event = event_generator.get_event()
-        logger.info(f"GENERATED EVENT: {event}")
 
+@cli.command()
+@click.option(
+    "--config-path",
+    "-c",
+    required=False,
+    default=None,
+    help="Postgres credentials for the postgres and e2e cases. The tables "
+         "in this database are dropped and reseeded for every case."
+)
+@click.option(
+    "--case",
+    "cases",
+    required=False,
+    multiple=True,
+    type=click.Choice(["generator", "postgres", "sqlite", "sqlite-target", "s3", "firehose", "e2e"]),  # noqa: E501
+    default=["generator", "postgres", "sqlite", "sqlite-target", "s3", "firehose", "e2e"],  # noqa: E501
+    help="Benchmark case to run, may be repeated. Defaults to all."
+)
+@click.option(
+    "--duration",
+    "-d",
+    required=False,
+    default=10.0,
+    type=float,
+    help="Time in seconds to run each case."
+)
+@click.option(
+    "--seed",
+    required=False,
+    default=0,
+    type=int,
+    help="Seed for every source of randomness."
+)
+@click.option(
+    "--table-sizes",
+    required=False,
+    default="0,1000,10000",
+    help="Comma separated number of users to seed before each Postgres case."
+)
+@click.option(
+    "--output",
+    "-o",
+    required=False,
+    default="benchmark.json",
+    help="Path the JSON results are written to."
+)
+@click.option(
+    "--baseline",
+    required=False,
+    default=None,
+    help="Baseline JSON results to compare against."
+)
+@click.option(
+    "--tolerance",
+    required=False,
+    default=0.1,
+    type=float,
+    help="Allowed fractional throughput drop against the baseline."
+)
+@click.option(
+    "--allow-missing-cases",
+    is_flag=True,
+    default=False,
+    help="Only warn about baseline cases that did not run, e.g. without "
+         "moto or --config-path, instead of failing."
+)
+@click.pass_context
+def benchmark(
+    ctx: dict,
+    config_path: str | None,
+    cases: tuple,
+    duration: float,
+    seed: int,
+    table_sizes: str,
+    output: str,
+    baseline: str | None,
+    tolerance: float,
+    allow_missing_cases: bool
+) -> None:
+    """
+    Benchmark the generator and each target in isolation and end to end.
+    """
+    credentials = None
+    if config_path:
+        credentials = AuthHandler().convert_to_dict(Path(config_path))
+
+    bench = Benchmark(duration=duration, seed=seed)
+    run_benchmarks(
+        bench,
+        cases,
+        [int(size) for size in table_sizes.split(",")],
+        credentials
+    )
+    bench.write(Path(output))
+
+    if baseline:
         try:
-            validation = postgres_target.validate_event(event)
-        except EventFailedValidation as err:
-            logger.error(err)
-            continue
-
-        payload = event_generator.generate_event_payload(event, validation)
-        logger.info(f"PAYLOAD: {payload}")
-        postgres_target.insert_event(payload)
-        firehose_target.write_event(payload)
-
-        time.sleep(float(event_lag))
-
-    postgres_target.close_connection()
-
-    return
+            bench.compare(Path(baseline), tolerance, allow_missing_cases)
+        except BenchmarkRegression as err:
+            raise click.ClickException(err.message)
 
 
 @cli.command()
@@ -169,64 +721,96 @@ def firehose_stream(
     help="Path of the config file containing the postgres credentials."
 )
 @click.option(
-    "--recreate",
-    "-r",
-    is_flag=True,
-    default=False,
-    help="Flag to recreate the tables before starting the stream."
+    "--source",
+    required=False,
+    default="s3",
+    type=click.Choice(["s3", "local"]),
+    help="Where the event log is read from: BUCKET_NAME or LOCAL_DIR."
 )
 @click.option(
-    "--event-lag",
-    "-e",
+    "--prefix",
     required=False,
-    default="1",
-    help="Time in seconds to wait between generating events."
+    default=None,
+    help="Key prefix of the event log. Defaults to S3_PREFIX or events/."
 )
 @click.option(
-    "--duration",
-    "-d",
+    "--workers",
     required=False,
-    default="60",
-    help="Time in seconds to run the stream."
+    default=os.cpu_count(),
+    type=int,
+    help="Number of processes folding the event log."
+)
+@click.option(
+    "--chunk-size",
+    required=False,
+    default=1000,
+    type=int,
+    help="Number of event log objects per work unit."
+)
+@click.option(
+    "--max-entries",
+    required=False,
+    default=100000,
+    type=int,
+    help="Users held in memory per worker before spilling to disk."
+)
+@click.option(
+    "--spill-dir",
+    required=False,
+    default=None,
+    help="Directory for spill files. Defaults to the system temp dir."
+)
+@click.option(
+    "--database",
+    required=False,
+    default=None,
+    help="Reconcile this SQLite database file, as written by "
+         "sqlite-stream, instead of Postgres."
 )
 @click.pass_context
-def pg_stream(
+def verify(
     ctx: dict,
     config_path: str,
-    recreate: bool,
-    event_lag: str,
-    duration: str
+    source: str,
+    prefix: str | None,
+    workers: int,
+    chunk_size: int,
+    max_entries: int,
+    spill_dir: str | None,
+    database: str | None
 ) -> None:
     """
-    Start streaming events to a target.
+    Reconcile Postgres (or SQLite) tables against the emitted event log.
     """
-    time_start = time.time()
-
     target_credentials = AuthHandler().convert_to_dict(Path(config_path))
-    postgres_target = PostgresTarget(target_credentials)
-    event_generator = EventGenerator()
-
-    postgres_target.create_tables(recreate=recreate)
-
-    while time.time() - time_start < int(duration):
-        event = event_generator.get_event()
-        logger.info(f"GENERATED EVENT: {event}")
-
-        try:
-            validation = postgres_target.validate_event(event)
-        except EventFailedValidation as err:
-            logger.error(err)
-            continue
-
-        payload = event_generator.generate_event_payload(event, validation)
-        logger.info(f"PAYLOAD: {payload}")
-        postgres_target.insert_event(payload)
-
-        time.sleep(float(event_lag))
-
-    postgres_target.close_connection()
-
-    return
+    if source == "s3":
+        event_log = S3EventLog(target_credentials, prefix=prefix)
+    else:
+        event_log = LocalEventLog(
+            Path(target_credentials.get("LOCAL_DIR", "output")),
+            prefix=prefix or target_credentials.get("S3_PREFIX", "events/")
+        )
+
+    if database:
+        target = SQLiteTarget({**target_credentials, "SQLITE_PATH": database})  # noqa: E501
+    else:
+        target = PostgresTarget(target_credentials)
+    verifier = Verifier(
+        event_log,
+        target,
+        workers=workers,
+        chunk_size=chunk_size,
+        max_entries=max_entries,
+        spill_dir=Path(spill_dir) if spill_dir else None
+    )
+    try:
+        verifier.run()
+    except VerificationFailed as err:
+        for example in err.report["examples"]:
+            click.echo(json.dumps(example), err=True)
+        raise click.ClickException(err.message)
+    finally:
+        target.close_connection()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,399 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+
+from exceptions import CoordinatorError
+from logger import logger
+
+
+# Metrics summed across nodes in the aggregated progress view.
+SUMMED_METRICS = ("events", "failed_validation", "events_per_s")
+
+
+def parse_address(address: str) -> tuple:
+    """
+    Split `host:port` into a TCP address, anything else is a Unix socket
+    path.
+    """
+    host, separator, port = address.rpartition(":")
+    if separator and "/" not in address and port.isdigit():
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+    return socket.AF_UNIX, address
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    One newline-delimited JSON request per line, answered in order.
+    """
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            try:
+                response = self.server.coordinator.handle(json.loads(line))
+            except (KeyError, TypeError, ValueError) as err:
+                response = {"error": f"Bad request: {err!r}"}
+
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class Coordinator:
+    """
+    Coordinate several generator processes writing one dataset.
+
+    The user id space is split into `shards` uuid ranges. Every node
+    leases one shard and only creates and picks users inside it, so nodes
+    never touch the same rows. A lease lapses when its node has not sent a
+    heartbeat for `lease_ttl` seconds and can then be taken by another
+    node.
+
+    Nodes draw event tokens from one global bucket refilled at `rate`
+    tokens per second and holding at most one second's worth (at least
+    one token, so rates below one per second still grant), which caps the
+    combined rate of all nodes. Without a `rate` tokens are unlimited.
+
+    Heartbeats carry each node's metrics, which are summed into the
+    progress logged every `report_interval` seconds.
+    """
+    def __init__(
+        self,
+        address: str,
+        shards: int = 16,
+        rate: float | None = None,
+        lease_ttl: float = 30.0,
+        report_interval: float = 5.0
+    ) -> None:
+        if not 1 <= shards <= 2**16:
+            raise ValueError(f"Shards must be between 1 and 65536, got {shards}")  # noqa: E501
+        if rate is not None and rate <= 0:
+            raise ValueError(f"Rate must be positive, got {rate}")
+
+        self.address = address
+        self.shards = shards
+        self.rate = rate
+        self.lease_ttl = lease_ttl
+        self.report_interval = report_interval
+
+        self.lock = threading.Lock()
+        self.leases = {}
+        self.metrics = {}
+        self.capacity = max(rate or 0, 1)
+        self.tokens = float(self.capacity)
+        self.refilled = time.monotonic()
+        self.server = None
+
+    def _lease(self, node: str, shard: int | None) -> dict:
+        now = time.monotonic()
+        if shard is None:
+            for candidate in range(self.shards):
+                lease = self.leases.get(candidate)
+                if lease is None or lease["expires"] < now or lease["node"] == node:  # noqa: E501
+                    shard = candidate
+                    break
+            else:
+                return {"error": f"All {self.shards} shards are leased"}
+        else:
+            if not 0 <= shard < self.shards:
+                return {"error": f"Shard {shard} out of range"}
+            lease = self.leases.get(shard)
+            if lease is not None and lease["expires"] >= now and lease["node"] != node:  # noqa: E501
+                return {"error": f"Shard {shard} is leased by {lease['node']}"}
+
+        self.leases[shard] = {"node": node, "expires": now + self.lease_ttl}
+        logger.info(f"Leased shard {shard}/{self.shards} to {node}")
+
+        return {"shard": shard, "shards": self.shards, "ttl": self.lease_ttl}
+
+    def _holds(self, node: str, shard: int) -> bool:
+        lease = self.leases.get(shard)
+
+        return lease is not None and lease["node"] == node
+
+    def _heartbeat(self, node: str, shard: int, metrics: dict) -> dict:
+        if not self._holds(node, shard):
+            return {"error": f"{node} no longer holds shard {shard}"}
+
+        self.leases[shard]["expires"] = time.monotonic() + self.lease_ttl
+        self.metrics[node] = {**metrics, "shard": shard}
+
+        return {"ok": True}
+
+    def _release(self, node: str, shard: int, metrics: dict) -> dict:
+        if self._holds(node, shard):
+            del self.leases[shard]
+            logger.info(f"Released shard {shard} from {node}")
+        self.metrics[node] = {**metrics, "shard": shard, "done": True}
+
+        return {"ok": True}
+
+    def _tokens(self, count: int) -> dict:
+        """
+        Grant up to `count` tokens, or say how long until one is available.
+        """
+        if self.rate is None:
+            return {"granted": count, "wait": 0.0}
+
+        now = time.monotonic()
+        self.tokens = min(
+            self.tokens + (now - self.refilled) * self.rate,
+            self.capacity
+        )
+        self.refilled = now
+
+        granted = min(count, int(self.tokens))
+        self.tokens -= granted
+
+        return {
+            "granted": granted,
+            "wait": 0.0 if granted else (1 - self.tokens) / self.rate,
+        }
+
+    def status(self) -> dict:
+        """
+        Leases and metrics summed across nodes.
+        """
+        with self.lock:
+            now = time.monotonic()
+            nodes = {node: dict(metrics) for node, metrics in self.metrics.items()}  # noqa: E501
+            active = {
+                shard: lease["node"]
+                for shard, lease in self.leases.items()
+                if lease["expires"] >= now
+            }
+
+        totals = {
+            name: sum(
+                metrics.get(name, 0)
+                for metrics in nodes.values()
+                if name != "events_per_s" or not metrics.get("done")
+            )
+            for name in SUMMED_METRICS
+        }
+
+        return {
+            "active_leases": len(active),
+            "leases": active,
+            "totals": totals,
+            "nodes": nodes,
+        }
+
+    def handle(self, request: dict) -> dict:
+        """
+        Answer one request from a node.
+        """
+        op = request["op"]
+        with self.lock:
+            if op == "lease":
+                return self._lease(request["node"], request.get("shard"))
+            if op == "heartbeat":
+                return self._heartbeat(request["node"], request["shard"], request["metrics"])  # noqa: E501
+            if op == "release":
+                return self._release(request["node"], request["shard"], request["metrics"])  # noqa: E501
+            if op == "tokens":
+                return self._tokens(int(request["count"]))
+
+        if op == "status":
+            return self.status()
+
+        return {"error": f"Unknown op: {op}"}
+
+    def start(self) -> None:
+        """
+        Serve requests on a background thread.
+        """
+        family, address = parse_address(self.address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(address):
+                os.unlink(address)
+            self.server = _UnixServer(address, _RequestHandler)
+        else:
+            self.server = _TCPServer(address, _RequestHandler)
+        self.server.coordinator = self
+
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()  # noqa: E501
+        logger.info(f"Coordinator listening on {self.address} with {self.shards} shards")  # noqa: E501
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+        family, address = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.unlink(address)
+
+    def run(self, duration: float | None = None) -> dict:
+        """
+        Serve and log progress until `duration` seconds have passed or the
+        process is interrupted. Returns the final status.
+        """
+        started = time.monotonic()
+        self.start()
+        try:
+            while duration is None or time.monotonic() - started < duration:
+                remaining = float("inf") if duration is None else duration - (time.monotonic() - started)  # noqa: E501
+                time.sleep(min(self.report_interval, max(remaining, 0)))
+                status = self.status()
+                logger.info(
+                    "Progress: %d active leases, %s",
+                    status["active_leases"],
+                    status["totals"]
+                )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+        status = self.status()
+        logger.info(f"Coordinator finished: {status['totals']}")
+
+        return status
+
+
+class CoordinatorClient:
+    """
+    A generator process's connection to the coordinator.
+
+    Tokens are fetched `token_batch` at a time, so a node makes one round
+    trip per batch of events rather than per event.
+
+    `start_heartbeats` renews the lease from a background thread every
+    `heartbeat_interval` seconds, so a node blocked on its target (e.g.
+    waiting for another node's SQLite write lock) keeps its shard. A lost
+    lease is raised from the next `acquire`.
+    """
+    def __init__(
+        self,
+        address: str,
+        node: str | None = None,
+        token_batch: int = 50,
+        heartbeat_interval: float = 5.0,
+        timeout: float = 10.0
+    ) -> None:
+        self.address = address
+        self.node = node or f"{socket.gethostname()}:{os.getpid()}"
+        self.token_batch = token_batch
+        self.heartbeat_interval = heartbeat_interval
+        self.shard = None
+        self.shards = None
+        self.tokens = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.heartbeats = None
+        self.error = None
+
+        family, target = parse_address(address)
+        try:
+            if family == socket.AF_UNIX:
+                self.socket = socket.socket(family)
+                self.socket.settimeout(timeout)
+                self.socket.connect(target)
+            else:
+                self.socket = socket.create_connection(target, timeout)
+        except OSError as err:
+            raise CoordinatorError(f"Cannot connect to coordinator at {address}: {err}")  # noqa: E501
+        self.file = self.socket.makefile("rwb")
+
+    def _call(self, request: dict) -> dict:
+        try:
+            with self.lock:
+                self.file.write(json.dumps(request).encode("utf-8") + b"\n")  # noqa: E501
+                self.file.flush()
+                line = self.file.readline()
+        except OSError as err:
+            raise CoordinatorError(f"Coordinator request failed: {err}")
+        if not line:
+            raise CoordinatorError("Coordinator closed the connection")
+
+        response = json.loads(line)
+        if "error" in response:
+            raise CoordinatorError(response["error"])
+
+        return response
+
+    def lease(self, shard: int | None = None) -> dict:
+        """
+        Lease a shard, a specific one when resuming.
+        """
+        response = self._call({"op": "lease", "node": self.node, "shard": shard})  # noqa: E501
+        self.shard = response["shard"]
+        self.shards = response["shards"]
+
+        return response
+
+    def acquire(self) -> None:
+        """
+        Take one event token, blocking until the global budget allows it.
+        """
+        if self.error is not None:
+            raise self.error
+
+        while not self.tokens:
+            response = self._call({"op": "tokens", "count": self.token_batch})  # noqa: E501
+            self.tokens = response["granted"]
+            if not self.tokens:
+                time.sleep(response["wait"])
+
+        self.tokens -= 1
+
+    def start_heartbeats(self, progress) -> None:
+        """
+        Send `progress()` with a heartbeat every `heartbeat_interval`
+        seconds until the lease is released or lost.
+        """
+        def beat() -> None:
+            while not self.stopped.wait(self.heartbeat_interval):
+                try:
+                    self.heartbeat(progress())
+                except CoordinatorError as err:
+                    logger.error(f"Lost shard {self.shard}: {err.message}")
+                    self.error = err
+                    return
+
+        self.heartbeats = threading.Thread(target=beat, daemon=True)
+        self.heartbeats.start()
+
+    def stop_heartbeats(self) -> None:
+        self.stopped.set()
+        if self.heartbeats is not None:
+            self.heartbeats.join()
+            self.heartbeats = None
+
+    def heartbeat(self, metrics: dict) -> None:
+        """
+        Renew the lease and report progress. Raises CoordinatorError when
+        the lease was lost.
+        """
+        self._call({
+            "op": "heartbeat",
+            "node": self.node,
+            "shard": self.shard,
+            "metrics": metrics,
+        })
+
+    def release(self, metrics: dict) -> None:
+        self.stop_heartbeats()
+        self._call({
+            "op": "release",
+            "node": self.node,
+            "shard": self.shard,
+            "metrics": metrics,
+        })
+
+    def close(self) -> None:
+        self.stop_heartbeats()
+        self.file.close()
+        self.socket.close()
@@ -46,3 +46,80 @@ PG_TABLES = {
         );
     """
 }
+
+# Position of the last committed checkpoint of each checkpointed stream.
+# Kept outside PG_TABLES so it survives --recreate.
+PG_CHECKPOINT_TABLE = """
+    CREATE TABLE IF NOT EXISTS stream_checkpoints (
+        name varchar primary key,
+        position bigint not null,
+        modified_at timestamp without time zone not null
+    );
+"""
+
+# SQLite translation of PG_TABLES. Ids are generated by the target since
+# SQLite has no uuid_generate_v4(), and amounts are stored as integer
+# cents so balance arithmetic stays exact.
+SQLITE_TABLES = {
+    "users": """
+        CREATE TABLE IF NOT EXISTS users (
+            id text primary key,
+            first_name text not null,
+            last_name text not null,
+            email text,
+            dob text not null,
+            state text,
+            modified_at text not null,
+            created_at text not null
+        );
+    """,
+    "applications": """
+        CREATE TABLE IF NOT EXISTS applications (
+            id text primary key,
+            user_id text references users(id),
+            status text not null,
+            modified_at text not null,
+            created_at text not null
+        );
+    """,
+    "balances": """
+        CREATE TABLE IF NOT EXISTS balances (
+            id text primary key,
+            user_id text references users(id),
+            amount integer not null,
+            modified_at text not null,
+            created_at text not null
+        );
+    """,
+    "withdrawals": """
+        CREATE TABLE IF NOT EXISTS withdrawals (
+            id text primary key,
+            user_id text references users(id),
+            amount integer not null,
+            created_at text not null
+        );
+    """,
+    "deposits": """
+        CREATE TABLE IF NOT EXISTS deposits (
+            id text primary key,
+            user_id text references users(id),
+            amount integer not null,
+            created_at text not null
+        );
+    """
+}
+
+# Indexes backing SQLiteTarget's validation lookups.
+SQLITE_INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS applications_user_id ON applications (user_id);",  # noqa: E501
+    "CREATE INDEX IF NOT EXISTS applications_status ON applications (status);",  # noqa: E501
+    "CREATE UNIQUE INDEX IF NOT EXISTS balances_user_id ON balances (user_id);",  # noqa: E501
+]
+
+SQLITE_CHECKPOINT_TABLE = """
+    CREATE TABLE IF NOT EXISTS stream_checkpoints (
+        name text primary key,
+        position integer not null,
+        modified_at text not null
+    );
+"""
@@ -0,0 +1,126 @@
+import random
+
+
+# Entity count an event needs to be non-zero to pass validation. Events
+# mapped to None are always valid.
+EVENT_REQUIREMENTS = {
+    "user sign up": None,
+    "user update demographic": "users",
+    "user application open": "unapplied_users",
+    "user application reject": "pending_applications",
+    "user application approve": "pending_applications",
+    "user deposit": "balances",
+    "user withdraw": "positive_balances",
+}
+
+
+class EligibilityTracker:
+    """
+    Live counts of the entities each event depends on.
+
+    Counts are seeded once from the database and then maintained from
+    the payloads that are applied, so choosing an event never needs a
+    round trip. `choose` samples from the configured weights and, when
+    the pick is not currently valid, records the rejection, remembers it
+    as owed and resamples among the valid events. Owed events are emitted
+    first once they become valid again, which keeps the long-run mix at
+    the configured weights.
+    """
+    def __init__(
+        self,
+        counts: dict | None = None,
+        max_owed: int = 1000
+    ) -> None:
+        self.counts = {
+            "users": 0,
+            "unapplied_users": 0,
+            "pending_applications": 0,
+            "balances": 0,
+            "positive_balances": 0,
+        }
+        self.counts.update(counts or {})
+        self.max_owed = max_owed
+        self.owed = {}
+        self.samples = 0
+        self.rejected = 0
+
+    def is_eligible(self, event: str) -> bool:
+        requirement = EVENT_REQUIREMENTS[event]
+
+        return requirement is None or self.counts[requirement] > 0
+
+    def choose(
+        self,
+        rng: random.Random,
+        events: list[str],
+        weights: list[int]
+    ) -> str:
+        """
+        Pick an event that is valid against the current counts.
+        """
+        for event, owed in self.owed.items():
+            if owed and self.is_eligible(event):
+                self.owed[event] = owed - 1
+                return event
+
+        self.samples += 1
+        event = rng.choices(events, weights=weights, k=1)[0]
+        if self.is_eligible(event):
+            return event
+
+        self.rejected += 1
+        self.owed[event] = min(self.owed.get(event, 0) + 1, self.max_owed)
+        eligible_weights = [
+            weight if self.is_eligible(candidate) else 0
+            for candidate, weight in zip(events, weights)
+        ]
+
+        return rng.choices(events, weights=eligible_weights, k=1)[0]
+
+    def record(self, payload: dict, validation: dict | bool) -> None:
+        """
+        Apply the state transition of an inserted payload to the counts.
+        """
+        event = payload["event"]
+        counts = self.counts
+
+        if event == "user sign up":
+            counts["users"] += 1
+            counts["unapplied_users"] += 1
+        elif event == "user application open":
+            counts["unapplied_users"] -= 1
+            counts["pending_applications"] += 1
+        elif event == "user application reject":
+            counts["pending_applications"] -= 1
+        elif event == "user application approve":
+            counts["pending_applications"] -= 1
+            counts["balances"] += 1
+        elif event == "user deposit":
+            if not validation.get("amount"):
+                counts["positive_balances"] += 1
+        elif event == "user withdraw":
+            if round(payload["amount"] * 100) == round(validation["amount"] * 100):  # noqa: E501
+                counts["positive_balances"] -= 1
+
+    def get_state(self) -> dict:
+        return {
+            "counts": dict(self.counts),
+            "owed": dict(self.owed),
+            "samples": self.samples,
+            "rejected": self.rejected,
+        }
+
+    def set_state(self, state: dict) -> None:
+        self.counts = dict(state["counts"])
+        self.owed = dict(state["owed"])
+        self.samples = state["samples"]
+        self.rejected = state["rejected"]
+
+    def metrics(self) -> dict:
+        return {
+            "samples": self.samples,
+            "rejected_samples": self.rejected,
+            "rejection_rate": self.rejected / self.samples if self.samples else 0.0,  # noqa: E501
+            "owed": sum(self.owed.values()),
+            **self.counts,
+        }
@@ -1,14 +1,66 @@
 import datetime
+import hashlib
 import random
 
 from faker import Faker
 
+from eligibility import EligibilityTracker
+
+
+# Logical clock origin used for `event_ts` when generation is seeded.
+SEEDED_EPOCH = datetime.datetime(2024, 1, 1)
+
+# Ages a signing up user can have.
+MIN_AGE = 18
+MAX_AGE = 75
+
+
+def derive_seed(root_seed: int, *path) -> int:
+    """
+    Derive an independent 64-bit seed for the substream named by `path`,
+    e.g. `derive_seed(seed, "events", worker)`.
+    """
+    key = repr((root_seed, *path)).encode("utf-8")
+    digest = hashlib.blake2b(key, digest_size=8).digest()
+
+    return int.from_bytes(digest, "big")
+
 
 class EventGenerator:
     """
     Event generator.
+
+    With a `seed`, event selection, amounts and Faker output all come from
+    substreams derived from (`seed`, `stream`), and `event_ts` follows a
+    logical clock of one millisecond per event interleaved across
+    `streams`. Dates of birth are drawn relative to `SEEDED_EPOCH` rather
+    than today. The n-th payload of a stream then depends only on the seed,
+    the stream and the validation results, never on how events are
+    batched, and parallel streams never share random state or timestamps.
+
+    With an `eligibility` tracker, `get_event` only returns events that are
+    valid against the tracked entity counts; call `record` after a payload
+    has been applied so the counts stay current.
     """
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        seed: int | None = None,
+        stream: int = 0,
+        streams: int = 1,
+        eligibility: EligibilityTracker | None = None
+    ) -> None:
+        self.seed = seed
+        self.stream = stream
+        self.streams = streams
+        self.events_generated = 0
+        self.fake = Faker()
+
+        if seed is None:
+            self.random = random.Random()
+        else:
+            self.random = random.Random(derive_seed(seed, "events", stream))
+            self.fake.seed_instance(derive_seed(seed, "faker", stream))
+
         self.events = [
             "user sign up",
             "user update demographic",
@@ -18,27 +70,91 @@ class EventGenerator:
             "user deposit",
             "user withdraw"
         ]
+        self.weights = [35, 2, 17, 5, 13, 20, 8]
+        self.eligibility = eligibility
 
     def get_event(self) -> str:
-        weights = [35, 2, 17, 5, 13, 20, 8]
-        event = random.choices(
+        if self.eligibility is not None:
+            return self.eligibility.choose(
+                self.random,
+                self.events,
+                self.weights
+            )
+
+        event = self.random.choices(
             self.events,
-            weights=weights,
+            weights=self.weights,
             k=1
         )
 
         return event[0]
 
-    def generate_event_payload(self, event: str, validation: dict) -> dict:
-        fake = Faker()
-        event_ts = (
-            datetime
-            .datetime
-            .now(datetime.UTC)
-            .replace(tzinfo=None)
-            .isoformat(timespec="milliseconds")
+    def get_state(self) -> dict:
+        """
+        Position and random state, enough to continue the same stream.
+        """
+        return {
+            "events_generated": self.events_generated,
+            "random": self.random.getstate(),
+            "faker_random": self.fake.random.getstate(),
+            "eligibility": (
+                None if self.eligibility is None
+                else self.eligibility.get_state()
+            ),
+        }
+
+    def set_state(self, state: dict) -> None:
+        """
+        Restore a state from `get_state`, possibly round-tripped via JSON.
+        """
+        def as_random_state(value: list) -> tuple:
+            return (value[0], tuple(value[1]), value[2])
+
+        self.events_generated = state["events_generated"]
+        self.random.setstate(as_random_state(state["random"]))
+        self.fake.random.setstate(as_random_state(state["faker_random"]))
+        if self.eligibility is not None and state["eligibility"] is not None:
+            self.eligibility.set_state(state["eligibility"])
+
+    def record(self, payload: dict, validation: dict | bool) -> None:
+        """
+        Update the eligibility counts with an applied payload.
+        """
+        if self.eligibility is not None:
+            self.eligibility.record(payload, validation)
+
+    def _next_event_ts(self) -> str:
+        """
+        Wall clock timestamp, or the logical clock when seeded.
+        """
+        if self.seed is None:
+            now = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+        else:
+            tick = self.events_generated * self.streams + self.stream
+            now = SEEDED_EPOCH + datetime.timedelta(milliseconds=tick)
+        self.events_generated += 1
+
+        return now.isoformat(timespec="milliseconds")
+
+    def _date_of_birth(self) -> datetime.date:
+        """
+        Date of birth of someone aged `MIN_AGE` to `MAX_AGE` today, or on
+        `SEEDED_EPOCH` when seeded.
+        """
+        if self.seed is None:
+            return self.fake.date_of_birth(minimum_age=MIN_AGE, maximum_age=MAX_AGE)  # noqa: E501
+
+        epoch = SEEDED_EPOCH.date()
+
+        return self.fake.date_between_dates(
+            epoch.replace(year=epoch.year - MAX_AGE - 1) + datetime.timedelta(days=1),  # noqa: E501
+            epoch.replace(year=epoch.year - MIN_AGE)
         )
 
+    def generate_event_payload(self, event: str, validation: dict) -> dict:
+        fake = self.fake
+        event_ts = self._next_event_ts()
+
         if event == "user sign up":
             payload = {
                 "event": event,
@@ -46,7 +162,7 @@ class EventGenerator:
                 "first_name": fake.first_name(),
                 "last_name": fake.last_name(),
                 "email": fake.email(),
-                "dob": fake.date_of_birth(minimum_age=18, maximum_age=75).isoformat(),  # noqa: E501
+                "dob": self._date_of_birth().isoformat(),
                 "state": fake.state_abbr()
             }
         elif event == "user update demographic":
@@ -83,7 +199,7 @@ class EventGenerator:
                 "status": "approved"
             }
         elif event == "user deposit":
-            amount = random.randint(1, 100000) / 100
+            amount = self.random.randint(1, 100000) / 100
 
             payload = {
                 "event": event,
@@ -92,7 +208,7 @@ class EventGenerator:
                 "amount": amount
             }
         elif event == "user withdraw":
-            amount = random.randint(1, validation["amount"]*100) / 100
+            amount = self.random.randint(1, int(validation["amount"]*100)) / 100  # noqa: E501
 
             payload = {
                 "event": event,
@@ -8,3 +8,56 @@ class EventFailedValidation(Exception):
     def __init__(self, message):
         self.message = message
         super().__init__(self.message)
+
+
+class BenchmarkRegression(Exception):
+    """Exception raised when a benchmark run is slower than its baseline.
+
+    Attributes:
+        message -- explanation of the error
+        regressions -- case name to (baseline, current) throughput, current
+                       is None for a baseline case that did not run
+    """
+
+    def __init__(self, message, regressions):
+        self.message = message
+        self.regressions = regressions
+        super().__init__(self.message)
+
+
+class VerificationFailed(Exception):
+    """Exception raised when Postgres does not match the event log.
+
+    Attributes:
+        message -- explanation of the error
+        report -- verification report including example mismatches
+    """
+
+    def __init__(self, message, report):
+        self.message = message
+        self.report = report
+        super().__init__(self.message)
+
+
+class CheckpointError(Exception):
+    """Exception raised when a stream cannot be resumed from a checkpoint.
+
+    Attributes:
+        message -- explanation of the error
+    """
+
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+
+class CoordinatorError(Exception):
+    """Exception raised when the coordinator refuses or fails a request.
+
+    Attributes:
+        message -- explanation of the error
+    """
+
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
@@ -1,6 +1,183 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
 
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')  # noqa: E501
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Hot-path categories are logged 1-in-N. A rate of 1 logs every record and a
+# rate of 0 silences the category entirely.
+DEFAULT_SAMPLE_RATES = {
+    "event": 10000,
+    "payload": 10000,
+    "query": 10000,
+    "write": 10000,
+    "validation": 10000,
+    "batch": 100,
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format log records as single line JSON objects.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Serialize the record, including its sampling category if any.
+        """
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "category": getattr(record, "category", None),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str)
+
+
+class SampledLogger:
+    """
+    Per-category sampling wrapper around a logger.
+
+    Records that are sampled out return before any message formatting
+    happens, so the cost of a dropped record is a dict lookup and a
+    counter update.
+    """
+    def __init__(self, logger: logging.Logger, sample_rates: dict) -> None:
+        self.logger = logger
+        self.sample_rates = {}
+        self.countdown = {}
+        self.set_rates(sample_rates)
+
+    def set_rates(self, sample_rates: dict) -> None:
+        """
+        Replace the sampling rates and reset the counters.
+        """
+        self.sample_rates = dict(sample_rates)
+        self.countdown = {category: 1 for category in self.sample_rates}
+
+    def _sample(self, level: int, category: str, msg: str, args: tuple) -> None:  # noqa: E501
+        """
+        Slow path, taken once every N calls: reset the countdown and emit.
+        """
+        rate = self.sample_rates.get(category, 1)
+        if rate == 0:
+            self.countdown[category] = float("inf")
+            return
+        self.countdown[category] = rate
+
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, msg, *args, extra={"category": category})
+
+    def log(self, level: int, category: str, msg: str, *args) -> None:
+        """
+        Log `msg % args` for one in every N calls of `category`.
+        """
+        remaining = self.countdown.get(category, 1) - 1
+        if remaining > 0:
+            self.countdown[category] = remaining
+            return
+        self._sample(level, category, msg, args)
+
+    # The level specific helpers repeat the countdown check instead of
+    # delegating to `log`, which saves a call frame per dropped record.
+    def debug(self, category: str, msg: str, *args) -> None:
+        remaining = self.countdown.get(category, 1) - 1
+        if remaining > 0:
+            self.countdown[category] = remaining
+            return
+        self._sample(logging.DEBUG, category, msg, args)
+
+    def info(self, category: str, msg: str, *args) -> None:
+        remaining = self.countdown.get(category, 1) - 1
+        if remaining > 0:
+            self.countdown[category] = remaining
+            return
+        self._sample(logging.INFO, category, msg, args)
+
+    def warning(self, category: str, msg: str, *args) -> None:
+        remaining = self.countdown.get(category, 1) - 1
+        if remaining > 0:
+            self.countdown[category] = remaining
+            return
+        self._sample(logging.WARNING, category, msg, args)
+
+
+_listener = None
+
+
+def _stop_listener() -> None:
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging(
+    level: str = "INFO",
+    sample_rates: dict | None = None,
+    json_output: bool = False
+) -> None:
+    """
+    Route all logging through a queue so the caller only pays for
+    enqueueing a record; formatting and writing happen on a background
+    thread.
+    """
+    _stop_listener()
+
+    stream_handler = logging.StreamHandler()
+    if json_output:
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level.upper())
+
+    global _listener
+    _listener = logging.handlers.QueueListener(
+        log_queue,
+        stream_handler,
+        respect_handler_level=True
+    )
+    _listener.start()
+
+    rates = dict(DEFAULT_SAMPLE_RATES)
+    rates.update(sample_rates or {})
+    sampled.set_rates(rates)
+
+
+def parse_sample_rates(values: tuple[str, ...]) -> dict:
+    """
+    Parse `category=N` pairs into a sampling rate dictionary.
+    """
+    rates = {}
+    for value in values:
+        category, _, rate = value.partition("=")
+        if not rate.isdigit():
+            raise ValueError(f"Invalid sample rate {value!r}, expected category=N")  # noqa: E501
+        category = category.strip()
+        if category not in DEFAULT_SAMPLE_RATES:
+            raise ValueError(
+                f"Unknown sample category {category!r}, expected one of "
+                f"{', '.join(DEFAULT_SAMPLE_RATES)}"
+            )
+        rates[category] = int(rate)
+
+    return rates
+
 
 logger = logging.getLogger(__name__)
+sampled = SampledLogger(logger, DEFAULT_SAMPLE_RATES)
+
+configure_logging()
+atexit.register(_stop_listener)
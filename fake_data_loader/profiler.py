@@ -0,0 +1,198 @@
+import cProfile
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+from logger import logger
+
+
+class StageStats:
+    """
+    Accumulated wall time of one pipeline stage.
+    """
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed: float) -> None:
+        self.calls += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "total_s": self.total,
+            "mean_us": self.total / self.calls * 1e6 if self.calls else 0.0,
+            "max_us": self.max * 1e6,
+        }
+
+
+class Profiler:
+    """
+    Profile a stream run.
+
+    Always attributes wall time to each pipeline stage and samples the
+    calling thread's stack into a flamegraph compatible folded stack file.
+    In `deterministic` mode the run is also wrapped in cProfile and a
+    pstats file is written. When `memory_interval` is set, tracemalloc
+    snapshots are diffed every `memory_interval` seconds to catch leaks.
+    """
+    def __init__(
+        self,
+        output_dir: Path,
+        mode: str = "sampling",
+        sample_interval: float = 0.005,
+        memory_interval: float | None = None
+    ) -> None:
+        if mode not in ("sampling", "deterministic"):
+            raise ValueError(f"Unknown profile mode: {mode}")
+
+        self.output_dir = output_dir
+        self.mode = mode
+        self.sample_interval = sample_interval
+        self.memory_interval = memory_interval
+        self.stages = {}
+        self.stacks = Counter()
+        self.memory_reports = []
+        self._profile = None
+        self._stop = threading.Event()
+        self._threads = []
+        self._target_thread_id = None
+        self._started_at = None
+
+    def time_stage(self, name: str, func, *args):
+        """
+        Call `func(*args)` and add its wall time to stage `name`.
+        """
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats()
+            stats.add(time.perf_counter() - start)
+
+    def start(self) -> None:
+        """
+        Start profiling the calling thread.
+        """
+        self._started_at = time.perf_counter()
+        self._target_thread_id = threading.get_ident()
+        self._stop.clear()
+
+        self._threads = [
+            threading.Thread(target=self._sample_stacks, daemon=True)
+        ]
+        if self.memory_interval:
+            tracemalloc.start(25)
+            self._threads.append(
+                threading.Thread(target=self._snapshot_memory, daemon=True)
+            )
+        for thread in self._threads:
+            thread.start()
+
+        if self.mode == "deterministic":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self) -> None:
+        """
+        Stop profiling and write the reports.
+        """
+        if self._profile is not None:
+            self._profile.disable()
+
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+        self.write_reports(time.perf_counter() - self._started_at)
+
+    def _sample_stacks(self) -> None:
+        """
+        Periodically record the target thread's stack in folded form.
+        """
+        while not self._stop.wait(self.sample_interval):
+            frame = sys._current_frames().get(self._target_thread_id)
+            if frame is None:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"  # noqa: E501
+                )
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def _snapshot_memory(self) -> None:
+        """
+        Diff tracemalloc snapshots every `memory_interval` seconds.
+        """
+        previous = tracemalloc.take_snapshot()
+        while not self._stop.wait(self.memory_interval):
+            current = tracemalloc.take_snapshot()
+            top = current.compare_to(previous, "lineno")[:10]
+            size, peak = tracemalloc.get_traced_memory()
+            self.memory_reports.append({
+                "elapsed_s": time.perf_counter() - self._started_at,
+                "traced_bytes": size,
+                "peak_bytes": peak,
+                "top_growth": [str(stat) for stat in top],
+            })
+            logger.info(
+                "Traced memory: %.1f MiB (peak %.1f MiB)",
+                size / 2**20,
+                peak / 2**20
+            )
+            previous = current
+
+    def write_reports(self, elapsed: float) -> None:
+        """
+        Write stage, folded stack, pstats and memory reports.
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        stages = {name: stats.to_dict() for name, stats in self.stages.items()}  # noqa: E501
+        for stats in stages.values():
+            stats["share"] = stats["total_s"] / elapsed if elapsed else 0.0
+        with (self.output_dir / "stages.json").open("w") as file:
+            json.dump({"elapsed_s": elapsed, "stages": stages}, file, indent=2)
+
+        with (self.output_dir / "profile.folded").open("w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+        if self._profile is not None:
+            self._profile.dump_stats(self.output_dir / "profile.pstats")
+
+        if self.memory_reports:
+            with (self.output_dir / "memory.json").open("w") as file:
+                json.dump(self.memory_reports, file, indent=2)
+
+        logger.info(f"Profile written to {self.output_dir} ({elapsed:.1f}s)")
+        for name, stats in sorted(
+            stages.items(),
+            key=lambda item: item[1]["total_s"],
+            reverse=True
+        ):
+            logger.info(
+                "  %-24s calls=%-8d total=%8.3fs mean=%9.1fus share=%5.1f%%",
+                name,
+                stats["calls"],
+                stats["total_s"],
+                stats["mean_us"],
+                stats["share"] * 100
+            )
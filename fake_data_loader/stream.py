@@ -0,0 +1,248 @@
+import time
+
+from checkpoint import Checkpointer
+from coordinator import CoordinatorClient
+from event_generator import EventGenerator
+from exceptions import EventFailedValidation
+from logger import logger, sampled
+
+
+class StreamRunner:
+    """
+    Drive the generate -> validate -> payload -> insert -> write loop
+    shared by every stream command. `target` is the stateful target
+    events are validated against and applied to (`PostgresTarget`,
+    `SQLiteTarget` or `MemoryTarget`).
+
+    With a `checkpointer`, the target is committed only at checkpoints
+    and payloads are held back from the sinks until the checkpoint that
+    covers them is durable. They are spooled to disk with it, so a crash
+    loses no committed work, and `restore` continues from the checkpoint
+    re-sending only what a sink had not acknowledged.
+
+    With a `coordinator`, every event waits for a token from the global
+    rate budget and progress is reported with each lease heartbeat. A
+    target with `exclusive_writes` is committed after every batch of
+    tokens, before waiting for the next.
+    """
+    def __init__(
+        self,
+        event_generator: EventGenerator,
+        target,
+        sinks: list,
+        profiler=None,
+        checkpointer: Checkpointer | None = None,
+        coordinator: CoordinatorClient | None = None
+    ) -> None:
+        self.event_generator = event_generator
+        self.target = target
+        self.sinks = sinks
+        self.profiler = profiler
+        self.checkpointer = checkpointer
+        self.coordinator = coordinator
+        self.elapsed_offset = 0.0
+        self.time_start = None
+        self.applied = 0
+        self.failed = 0
+        self.pending = []
+        self.unwritten = None
+        self.acked = {self._sink_name(sink): 0 for sink in sinks}
+
+    @staticmethod
+    def _sink_name(sink) -> str:
+        return type(sink).__name__
+
+    def _stage(self, name: str, func, *args):
+        """
+        Call `func`, attributing its wall time to `name` when profiling.
+        """
+        if self.profiler is None:
+            return func(*args)
+
+        return self.profiler.time_stage(name, func, *args)
+
+    def _write(self, payload: dict, sinks: list) -> None:
+        for sink in sinks:
+            self._stage(
+                f"write:{self._sink_name(sink)}",
+                sink.write_event,
+                payload
+            )
+
+    def flush_sinks(self) -> None:
+        for sink in self.sinks:
+            self._stage(f"flush:{self._sink_name(sink)}", sink.flush)
+
+    def flush_interrupted(self) -> None:
+        """
+        Flush the target and the sinks after the loop stopped early, so
+        the batched events reach the event log as well as the target. An
+        event inserted but not yet written when the loop stopped is
+        written first.
+        """
+        try:
+            if self.unwritten is not None:
+                self._write(self.unwritten, self.sinks)
+                self.unwritten = None
+            self.target.flush()
+            self.flush_sinks()
+        except Exception as err:
+            logger.error(f"Could not flush the stopped run: {err}")
+
+    def yield_writes(self) -> None:
+        """
+        Commit before asking the coordinator for more tokens when the
+        target's open transaction would keep the other nodes from
+        writing, so that no node holds it while throttled. Checkpointed
+        runs commit with a checkpoint.
+        """
+        if not self.target.exclusive_writes:
+            return
+
+        if self.checkpointer is None:
+            self._stage("flush:target", self.target.flush)
+        elif self.pending:
+            self.checkpoint(time.time() - self.time_start)
+
+    def _commit(self, position: int) -> None:
+        self.target.commit_checkpoint(self.checkpointer.name, position)
+
+    def checkpoint(self, elapsed: float) -> None:
+        """
+        Spool the held back payloads, commit the target, then release the
+        payloads to the sinks and record them as acknowledged.
+        """
+        position = self.event_generator.events_generated
+        self.checkpointer.spool(self.pending)
+        state = {
+            "position": position,
+            "elapsed_s": elapsed,
+            "generator": self.event_generator.get_state(),
+            "acked": dict(self.acked),
+            "spooled": len(self.pending),
+            "shard": None if self.coordinator is None else self.coordinator.shard,  # noqa: E501
+        }
+        self.checkpointer.save(state, commit=self._commit)
+
+        for payload in self.pending:
+            self._write(payload, self.sinks)
+        self.flush_sinks()
+        self.acked = {name: position for name in self.acked}
+        self.pending = []
+        self.checkpointer.save({**state, "acked": dict(self.acked)})
+
+    def restore(self, state: dict) -> None:
+        """
+        Continue from a checkpoint, first re-reading from the spool any
+        committed payloads a sink had not acknowledged.
+        """
+        self.event_generator.set_state(state["generator"])
+        self.elapsed_offset = state["elapsed_s"]
+
+        position = state["position"]
+        first = position - state["spooled"]
+        for sink in self.sinks:
+            acked = state["acked"].get(self._sink_name(sink), 0)
+            if acked >= position:
+                continue
+
+            logger.info(f"Re-sending {position - max(acked, first)} unacknowledged events to {self._sink_name(sink)}")  # noqa: E501
+            for payload in self.checkpointer.read_spool(max(acked - first, 0)):  # noqa: E501
+                self._write(payload, [sink])
+            sink.flush()
+        self.acked = {name: position for name in self.acked}
+
+    def progress(self) -> dict:
+        """
+        Events applied and rejected by validation during this run.
+        """
+        elapsed = time.time() - self.time_start if self.time_start else 0.0
+        elapsed -= self.elapsed_offset
+
+        return {
+            "events": self.applied,
+            "failed_validation": self.failed,
+            "elapsed_s": elapsed,
+            "events_per_s": self.applied / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def run(self, duration: float, event_lag: float) -> None:
+        """
+        Stream events until `duration` seconds have elapsed, counting the
+        time spent before a restored checkpoint.
+        """
+        time_start = self.time_start = time.time() - self.elapsed_offset
+
+        if self.profiler is not None:
+            self.profiler.start()
+        if self.coordinator is not None:
+            self.coordinator.start_heartbeats(self.progress)
+
+        try:
+            while time.time() - time_start < duration:
+                if self.coordinator is not None:
+                    if not self.coordinator.tokens:
+                        self.yield_writes()
+                    self._stage("rate", self.coordinator.acquire)
+
+                event = self._stage("generate", self.event_generator.get_event)  # noqa: E501
+                sampled.info("event", "GENERATED EVENT: %s", event)
+
+                try:
+                    validation = self._stage(
+                        "validate",
+                        self.target.validate_event,
+                        event
+                    )
+                except EventFailedValidation as err:
+                    sampled.warning("validation", "%s", err)
+                    self.failed += 1
+                    continue
+
+                payload = self._stage(
+                    "payload",
+                    self.event_generator.generate_event_payload,
+                    event,
+                    validation
+                )
+                sampled.info("payload", "PAYLOAD: %s", payload)
+                self._stage("insert", self.target.insert_event, payload)  # noqa: E501
+                self.event_generator.record(payload, validation)
+                self.applied += 1
+
+                if self.checkpointer is None:
+                    self.unwritten = payload
+                    self._write(payload, self.sinks)
+                    self.unwritten = None
+                else:
+                    self.pending.append(payload)
+                    if self.checkpointer.due(len(self.pending)):
+                        self.checkpoint(time.time() - time_start)
+
+                if event_lag:
+                    time.sleep(event_lag)
+
+            if self.checkpointer is not None:
+                self.checkpoint(time.time() - time_start)
+            else:
+                self._stage("flush:target", self.target.flush)
+                self.flush_sinks()
+        except BaseException:
+            if self.checkpointer is not None:
+                self.target.rollback()
+            else:
+                self.flush_interrupted()
+            raise
+        finally:
+            if self.profiler is not None:
+                self.profiler.stop()
+
+            if self.event_generator.eligibility is not None:
+                logger.info(
+                    "Event selection: %s",
+                    self.event_generator.eligibility.metrics()
+                )
+
+            for target in [self.target, *self.sinks]:
+                if target.batcher is not None:
+                    target.batcher.log_metrics()
@@ -1,24 +1,108 @@
+import hashlib
 import json
+import random
 import re
+import shutil
+import sqlite3
 import tempfile
+import uuid
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
 
 import boto3
+from botocore.config import Config
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError, BotoCoreError, ClientError  # noqa: E501
 import psycopg2
 from psycopg2 import OperationalError
 from psycopg2.errors import UndefinedTable
 
-from ddl import PG_TABLES
+from batching import AdaptiveBatcher, AimdController
+from bulk_delete import BulkDeleter
+from ddl import PG_CHECKPOINT_TABLE, PG_TABLES, SQLITE_CHECKPOINT_TABLE, SQLITE_INDEXES, SQLITE_TABLES  # noqa: E501
+from event_generator import derive_seed
 from exceptions import EventFailedValidation
-from logger import logger
+from logger import logger, sampled
+
+
+def partition_key(prefix: str, event_ts: str, suffix: str = "") -> str:
+    """
+    Generate a key partitioned by `event_ts`, e.g.
+    `events/2024/01/01/2024_01_01T00_00_00_000_<suffix>.json`.
+    """
+    filename = re.sub(r"[-:.]", "_", event_ts) + suffix + ".json"
+    date_partition = (
+        datetime
+        .strptime(
+            event_ts,
+            "%Y-%m-%dT%H:%M:%S.%f"
+        )
+        .strftime("%Y/%m/%d")
+    )
+
+    return f"{prefix}{date_partition}/{filename}"
+
+
+def payload_digest(payload: dict) -> str:
+    """
+    Short digest of the payload's contents. Several events share an
+    `event_ts` when they are generated less than a millisecond apart, so
+    per-event keys carry the digest to stay unique, while re-sending the
+    same payload still overwrites the same key.
+    """
+    body = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+
+    return hashlib.blake2b(body, digest_size=8).hexdigest()
+
+
+def event_key(prefix: str, payload: dict) -> str:
+    """
+    Key of the object holding a single event.
+    """
+    return partition_key(
+        prefix,
+        payload["event_ts"],
+        suffix=f"_{payload_digest(payload)}"
+    )
+
+
+def shard_prefixes(shard: int, shards: int) -> range:
+    """
+    Top 16 bits of the user ids belonging to `shard` of `shards`.
+    """
+    return range(shard * 2**16 // shards, (shard + 1) * 2**16 // shards)
+
+
+def shard_bounds(prefixes: range) -> tuple[str, str]:
+    """
+    Lowest and highest uuid whose top 16 bits are in `prefixes`.
+    """
+    return (
+        str(uuid.UUID(int=prefixes.start << 112)),
+        str(uuid.UUID(int=(prefixes.stop << 112) - 1)),
+    )
+
+
+def new_user_id(rng: random.Random, prefixes: range) -> str:
+    """
+    Random version 4 uuid whose top 16 bits are in `prefixes`.
+    """
+    value = rng.randrange(prefixes.start, prefixes.stop) << 112 | rng.getrandbits(112)  # noqa: E501
+
+    return str(uuid.UUID(int=value, version=4))
 
 
 class Target(ABC):
     """
     Abstract class for targets.
     """
+    batcher = None
+    # Whether an open transaction blocks every other writer of the same
+    # database, so coordinated nodes must commit before they throttle.
+    exclusive_writes = False
+
     @abstractmethod
     def __init__(self, credentials: dict) -> None:
         """
@@ -26,15 +110,48 @@ class Target(ABC):
         """
         pass
 
+    def enable_batching(self, controller: AimdController) -> None:
+        """
+        Buffer writes and flush them through `_flush_batch` in batches
+        sized by `controller`.
+        """
+        self.batcher = AdaptiveBatcher(
+            type(self).__name__,
+            self._flush_batch,
+            controller
+        )
+
+    def _flush_batch(self, items: list) -> None:
+        raise NotImplementedError(f"{type(self).__name__} does not support batching")  # noqa: E501
+
+    def set_shard(self, shard: int, shards: int) -> None:
+        """
+        Only create and pick users whose ids fall in `shard` of `shards`.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support sharding")  # noqa: E501
+
+    def flush(self) -> None:
+        """
+        Write out anything buffered by the batcher.
+        """
+        if self.batcher is not None:
+            self.batcher.flush()
+
 
 class PostgresTarget(Target):
     """
     Postgres target.
+
+    With a `cdc` emitter, every event's row changes are read back with
+    RETURNING (plus a read of the row before each update) and committed
+    to it as one transaction, as `MemoryTarget` does.
     """
-    def __init__(self, credentials: dict) -> None:
+    def __init__(self, credentials: dict, cdc=None) -> None:
         """
         Connect to Postgres.
         """
+        self.cdc = cdc
+        self.changes = []
         try:
             self.connection = psycopg2.connect(
                 user=credentials["PG_USERNAME"],
@@ -45,10 +162,37 @@ class PostgresTarget(Target):
             )
             self.connection.set_session(autocommit=True)
             self.cursor = self.connection.cursor()
+            self.event_queries = []
+            self.pending_users = set()
+            self.id_random = random.Random()
+            self.user_prefixes = range(2**16)
+            self.shard_bounds = shard_bounds(self.user_prefixes)
             logger.info("Connection to postgres established.")
         except OperationalError as err:
             logger.error(err)
 
+    def set_seed(self, seed: int, *path) -> None:
+        """
+        Seed the session's RANDOM() and the user id generator from the
+        substream `path` of `seed`, so that validation picks the same rows
+        and sign ups get the same ids from the same table state. The user
+        count is mixed into the ids, so a seeded run against a populated
+        database does not regenerate ids that are already taken.
+        """
+        self.cursor.execute(
+            "SELECT setseed(%s);",
+            (derive_seed(seed, "postgres", *path) / 2**63 - 1,)
+        )
+        self.cursor.execute("SELECT COUNT(*) FROM users;")
+        self.id_random.seed(derive_seed(seed, "ids", *path, self.cursor.fetchone()[0]))  # noqa: E501
+
+    def set_shard(self, shard: int, shards: int) -> None:
+        """
+        Only create and pick users whose ids fall in `shard` of `shards`.
+        """
+        self.user_prefixes = shard_prefixes(shard, shards)
+        self.shard_bounds = shard_bounds(self.user_prefixes)
+
     def create_tables(self, recreate: bool) -> None:
         """
         Create tables.
@@ -74,18 +218,85 @@ class PostgresTarget(Target):
             logger.info(f"Creating {table} if not exists...")
             self.cursor.execute(ddl)
 
+    def enable_checkpoints(self) -> None:
+        """
+        Create the checkpoint table and switch to explicit transactions, so
+        nothing is committed until `commit_checkpoint`.
+        """
+        self.cursor.execute(PG_CHECKPOINT_TABLE)
+        self.connection.set_session(autocommit=False)
+
+    def commit_checkpoint(self, name: str, position: int) -> None:
+        """
+        Record the checkpoint position and commit everything applied
+        since the previous checkpoint.
+        """
+        self.flush()
+        self.cursor.execute("""
+            INSERT INTO stream_checkpoints (name, position, modified_at)
+                VALUES (%s, %s, now() at time zone 'utc')
+            ON CONFLICT (name) DO UPDATE
+                SET position = EXCLUDED.position, modified_at = EXCLUDED.modified_at;
+        """, (name, position))  # noqa: E501
+        self.connection.commit()
+
+    def committed_position(self, name: str) -> int | None:
+        """
+        Position of the last committed checkpoint, if any.
+        """
+        self.cursor.execute("""
+            SELECT position
+            FROM stream_checkpoints
+            WHERE name = %s;
+        """, (name,))
+
+        results = self.cursor.fetchone()
+
+        return results[0] if results else None
+
+    def rollback(self) -> None:
+        """
+        Discard everything applied since the last commit.
+        """
+        if self.batcher is not None:
+            self.batcher.discard()
+        self.event_queries = []
+        self.changes = []
+        self.pending_users.clear()
+
+        if not self.connection.autocommit:
+            self.connection.rollback()
+
+    def _pick(self, query: str) -> tuple | None:
+        """
+        Pick a random row with a validation query over the shard's users.
+        When batching, a row whose user has buffered writes, or no row
+        while writes are buffered, flushes the batch and picks again, so
+        the event is validated against the state it is applied to.
+        """
+        self.cursor.execute(query, self.shard_bounds)
+        results = self.cursor.fetchone()
+
+        if self.batcher is not None and self.batcher.buffer and (
+            results is None or str(results[0]) in self.pending_users
+        ):
+            self.batcher.flush()
+            self.cursor.execute(query, self.shard_bounds)
+            results = self.cursor.fetchone()
+
+        return results
+
     def _validate_user_update_demographic(self) -> dict | None:
         depedencies = {}
 
-        self.cursor.execute("""
+        results = self._pick("""
             SELECT id
             FROM users
+            WHERE id BETWEEN %s::uuid AND %s::uuid
             ORDER BY RANDOM()
             LIMIT 1;
         """)
 
-        results = self.cursor.fetchone()
-
         if not results:
             return None
 
@@ -107,19 +318,18 @@ class PostgresTarget(Target):
     def _validate_user_application_open(self) -> dict | None:
         dependencies = {}
 
-        self.cursor.execute("""
+        results = self._pick("""
             SELECT id
             FROM users
             WHERE id NOT IN (
                 SELECT user_id
                 FROM applications
             )
+            AND id BETWEEN %s::uuid AND %s::uuid
             ORDER BY RANDOM()
             LIMIT 1;
         """)
 
-        results = self.cursor.fetchone()
-
         if not results:
             return None
 
@@ -131,16 +341,15 @@ class PostgresTarget(Target):
     def _validate_user_application_reject(self) -> dict | None:
         dependencies = {}
 
-        self.cursor.execute("""
+        results = self._pick("""
             SELECT user_id
             FROM applications
             WHERE status = 'pending'
+            AND user_id BETWEEN %s::uuid AND %s::uuid
             ORDER BY RANDOM()
             LIMIT 1;
         """)
 
-        results = self.cursor.fetchone()
-
         if not results:
             return None
 
@@ -152,16 +361,15 @@ class PostgresTarget(Target):
     def _validate_user_application_approve(self) -> dict | None:
         dependencies = {}
 
-        self.cursor.execute("""
+        results = self._pick("""
             SELECT user_id
             FROM applications
             WHERE status = 'pending'
+            AND user_id BETWEEN %s::uuid AND %s::uuid
             ORDER BY RANDOM()
             LIMIT 1;
         """)
 
-        results = self.cursor.fetchone()
-
         if not results:
             return None
 
@@ -173,36 +381,36 @@ class PostgresTarget(Target):
     def _validate_user_deposit(self) -> dict | None:
         dependencies = {}
 
-        self.cursor.execute("""
-            SELECT user_id
+        results = self._pick("""
+            SELECT user_id, amount
             FROM balances
+            WHERE user_id BETWEEN %s::uuid AND %s::uuid
             ORDER BY RANDOM()
             LIMIT 1;
         """)
 
-        results = self.cursor.fetchone()
-
         if not results:
             return None
 
         user_id = results[0]
+        amount = results[1]
         dependencies["user_id"] = user_id
+        dependencies["amount"] = amount
 
         return dependencies
 
     def _validate_user_withdraw(self) -> dict | None:
         dependencies = {}
 
-        self.cursor.execute("""
+        results = self._pick("""
             SELECT user_id, amount
             FROM balances
             WHERE amount > 0
+            AND user_id BETWEEN %s::uuid AND %s::uuid
             ORDER BY RANDOM()
             LIMIT 1;
         """)
 
-        results = self.cursor.fetchone()
-
         if not results:
             return None
 
@@ -213,6 +421,61 @@ class PostgresTarget(Target):
 
         return dependencies
 
+    def eligibility_counts(self) -> dict:
+        """
+        Count the entities each event depends on.
+        """
+        lower, upper = self.shard_bounds
+        self.cursor.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM users WHERE id BETWEEN %(lower)s::uuid AND %(upper)s::uuid),
+                (
+                    SELECT COUNT(*)
+                    FROM users
+                    WHERE id BETWEEN %(lower)s::uuid AND %(upper)s::uuid
+                    AND NOT EXISTS (
+                        SELECT 1
+                        FROM applications
+                        WHERE applications.user_id = users.id
+                    )
+                ),
+                (SELECT COUNT(*) FROM applications WHERE status = 'pending' AND user_id BETWEEN %(lower)s::uuid AND %(upper)s::uuid),
+                (SELECT COUNT(*) FROM balances WHERE user_id BETWEEN %(lower)s::uuid AND %(upper)s::uuid),
+                (SELECT COUNT(*) FROM balances WHERE amount > 0 AND user_id BETWEEN %(lower)s::uuid AND %(upper)s::uuid);
+        """, {"lower": lower, "upper": upper})  # noqa: E501
+
+        results = self.cursor.fetchone()
+
+        return {
+            "users": results[0],
+            "unapplied_users": results[1],
+            "pending_applications": results[2],
+            "balances": results[3],
+            "positive_balances": results[4],
+        }
+
+    def row_count(self, table: str) -> int:
+        self.cursor.execute(f"SELECT COUNT(*) FROM {table};")
+
+        return self.cursor.fetchone()[0]
+
+    def iter_balances(self):
+        """
+        Yield every `(user_id, amount)` in user id order, streamed from a
+        server-side cursor.
+        """
+        cursor = self.connection.cursor(name="iter_balances", withhold=True)
+        cursor.itersize = 10000
+        try:
+            cursor.execute("""
+                SELECT user_id::text, amount
+                FROM balances
+                ORDER BY user_id;
+            """)
+            yield from cursor
+        finally:
+            cursor.close()
+
     def validate_event(self, event: str) -> dict | EventFailedValidation:
         """
         Validate an event
@@ -242,9 +505,10 @@ class PostgresTarget(Target):
         Insert user signup row.
         """
         query = f"""
-            INSERT INTO users (first_name, last_name, email, dob, state, modified_at, created_at)
+            INSERT INTO users (id, first_name, last_name, email, dob, state, modified_at, created_at)
                 VALUES
                     (
+                        '{new_user_id(self.id_random, self.user_prefixes)}',
                         '{payload["first_name"]}',
                         '{payload["last_name"]}',
                         '{payload["email"]}',
@@ -254,9 +518,9 @@ class PostgresTarget(Target):
                         '{payload["event_ts"]}'
                     );
         """  # noqa: E501
-        logger.info(f"QUERY: {query}")
+        sampled.info("query", "QUERY: %s", query)
 
-        self.cursor.execute(query)
+        self._write("users", "c", query)
 
     def _update_user_update_demographic(self, payload: dict) -> None:
         """
@@ -267,9 +531,9 @@ class PostgresTarget(Target):
             SET state = '{payload["state"]}', modified_at = '{payload["event_ts"]}'
             WHERE id = '{payload["id"]}';
         """  # noqa: E501
-        logger.info(f"QUERY: {query}")
+        sampled.info("query", "QUERY: %s", query)
 
-        self.cursor.execute(query)
+        self._write("users", "u", query, ("id", payload["id"]))
 
     def _insert_user_application_open(self, payload: dict) -> None:
         """
@@ -284,9 +548,9 @@ class PostgresTarget(Target):
                     '{payload["event_ts"]}'
                 );
         """
-        logger.info(f"QUERY: {query}")
+        sampled.info("query", "QUERY: %s", query)
 
-        self.cursor.execute(query)
+        self._write("applications", "c", query)
 
     def _update_user_application_reject(self, payload: dict) -> None:
         """
@@ -297,9 +561,9 @@ class PostgresTarget(Target):
             SET status = '{payload["status"]}', modified_at = '{payload["event_ts"]}'
             WHERE user_id = '{payload["user_id"]}';
         """  # noqa: E501
-        logger.info(f"QUERY: {query}")
+        sampled.info("query", "QUERY: %s", query)
 
-        self.cursor.execute(query)
+        self._write("applications", "u", query, ("user_id", payload["user_id"]))
 
     def _update_user_application_approve(self, payload: dict) -> None:
         """
@@ -310,9 +574,9 @@ class PostgresTarget(Target):
             SET status = '{payload["status"]}', modified_at = '{payload["event_ts"]}'
             WHERE user_id = '{payload["user_id"]}';
         """  # noqa: E501
-        logger.info(f"QUERY: {query}")
+        sampled.info("query", "QUERY: %s", query)
 
-        self.cursor.execute(query)
+        self._write("applications", "u", query, ("user_id", payload["user_id"]))
 
         query = f"""
             INSERT INTO balances (user_id, amount, modified_at, created_at)
@@ -323,9 +587,9 @@ class PostgresTarget(Target):
                     '{payload["event_ts"]}'
                 );
         """
-        logger.info(f"QUERY: {query}")
+        sampled.info("query", "QUERY: %s", query)
 
-        self.cursor.execute(query)
+        self._write("balances", "c", query)
 
     def _insert_user_deposit(self, payload: dict) -> None:
         """
@@ -339,18 +603,18 @@ class PostgresTarget(Target):
                     '{payload["event_ts"]}'
                 );
         """  # noqa: E501
-        logger.info(f"QUERY: {query}")
+        sampled.info("query", "QUERY: %s", query)
 
-        self.cursor.execute(query)
+        self._write("deposits", "c", query)
 
         query = f"""
             UPDATE balances
             SET amount = amount + {payload["amount"]}, modified_at = '{payload["event_ts"]}'
             WHERE user_id = '{payload["user_id"]}';
         """  # noqa: E501
-        logger.info(f"QUERY: {query}")
+        sampled.info("query", "QUERY: %s", query)
 
-        self.cursor.execute(query)
+        self._write("balances", "u", query, ("user_id", payload["user_id"]))
 
     def _insert_user_withdraw(self, payload: dict) -> None:
         """
@@ -364,20 +628,65 @@ class PostgresTarget(Target):
                     '{payload["event_ts"]}'
                 );
         """  # noqa: E501
-        logger.info(f"QUERY: {query}")
+        sampled.info("query", "QUERY: %s", query)
 
-        self.cursor.execute(query)
+        self._write("withdrawals", "c", query)
 
         query = f"""
             UPDATE balances
             SET amount = amount - {payload["amount"]}, modified_at = '{payload["event_ts"]}'
             WHERE user_id = '{payload["user_id"]}';
         """  # noqa: E501
-        logger.info(f"QUERY: {query}")
+        sampled.info("query", "QUERY: %s", query)
+
+        self._write("balances", "u", query, ("user_id", payload["user_id"]))
+
+    def _write(self, table: str, op: str, query: str, key: tuple | None = None) -> None:  # noqa: E501
+        """
+        Execute a write query. With a change sink, inserts (`op` "c")
+        return the new row and updates (`op` "u") of the row where the
+        (`column`, `value`) `key` matches also read the row before, to
+        build the change record.
+        """
+        if self.cdc is None:
+            self._execute(query)
+            return
+
+        before = None
+        if op == "u":
+            column, value = key
+            self.cursor.execute(f"SELECT * FROM {table} WHERE {column} = %s;", (value,))  # noqa: E501
+            before = self._row()
+        self.cursor.execute(query.rstrip().rstrip(";") + " RETURNING *;")
+        self.changes.append((table, op, before, self._row()))
 
-        self.cursor.execute(query)
+    def _row(self) -> dict:
+        names = [column.name for column in self.cursor.description]
+
+        return dict(zip(names, self.cursor.fetchone()))
+
+    def _execute(self, query: str) -> None:
+        """
+        Execute a write query, or hold it for the batch when batching.
+        """
+        if self.batcher is None:
+            self.cursor.execute(query)
+        else:
+            self.event_queries.append(query)
+
+    def _flush_batch(self, items: list[str]) -> None:
+        """
+        Send a batch of events' queries in a single round trip.
+        """
+        self.cursor.execute("\n".join(items))
+        self.pending_users.clear()
 
     def insert_event(self, payload: dict) -> None | EventFailedValidation:
+        """
+        Apply an event. When batching, its queries are buffered as one unit
+        and its user is tracked until they are flushed, so that `_pick`
+        flushes before validating another event against that user.
+        """
         event = payload["event"]
 
         if event == "user sign up":
@@ -395,30 +704,496 @@ class PostgresTarget(Target):
         elif event == "user withdraw":
             self._insert_user_withdraw(payload)
 
+        if self.cdc is not None:
+            self.cdc.commit(self.changes, payload["event_ts"])
+            self.changes = []
+
+        if self.batcher is not None:
+            user_id = payload.get("user_id", payload.get("id"))
+            if user_id is not None:
+                self.pending_users.add(user_id)
+            self.batcher.add("\n".join(self.event_queries))
+            self.event_queries = []
+
     def close_connection(self) -> None:
         """
         Close connection.
         """
+        self.flush()
+        if self.cdc is not None:
+            self.cdc.flush()
+        self.cursor.close()
+        self.connection.close()
+
+
+# Random rowids SQLiteTarget looks up before falling back to a scan.
+SQLITE_RANDOM_PROBES = 8
+
+
+class SQLiteTarget(Target):
+    """
+    SQLite target, a local stand-in for `PostgresTarget`.
+
+    Uses the same validation rules and state transitions on the schemas
+    in `SQLITE_TABLES`. The database runs in WAL mode and writes are
+    committed every `SQLITE_BATCH_SIZE` events, 1000 by default (or by
+    the adaptive batcher, or at checkpoints). The open transaction holds
+    the database's only write lock, so larger batches commit less often
+    at the cost of longer waits for other writers and staler reads for
+    concurrent readers. All statements are parameterized, so
+    sqlite3 reuses its prepared statements. `SQLITE_CACHE_MB` sizes the
+    page cache, which the random uuid keys of the indexes need to stay
+    fast once the tables outgrow SQLite's default 2 MB.
+
+    Random rows are picked by looking up random rowids, falling back to
+    seeking to a random rowid and taking the first eligible row from
+    there, index lookups instead of the full scan `ORDER BY RANDOM()`
+    needs. The max rowid of each table is cached and advanced by this
+    connection's inserts, which is exact for the rows of its own shard.
+
+    The connection must only be used from the thread that opened it.
+    Several processes can share one database file, but only one of them
+    writes at a time, so `exclusive_writes` is set.
+
+    With a `cdc` emitter, every event's row changes are read back with
+    RETURNING and committed to it as one transaction, as `PostgresTarget`
+    does.
+    """
+    exclusive_writes = True
+
+    def __init__(self, credentials: dict, cdc=None) -> None:
+        """
+        Open the database.
+        """
+        self.cdc = cdc
+        self.changes = []
+        self.path = credentials.get("SQLITE_PATH", "fake_data_loader.db")
+        self.batch_size = int(credentials.get("SQLITE_BATCH_SIZE", 1000))
+        self.uncommitted = 0
+        self.checkpointing = False
+        self.max_rowids = {}
+        self.random = random.Random()
+        self.user_prefixes = range(2**16)
+        self.shard_bounds = shard_bounds(self.user_prefixes)
+
+        self.connection = sqlite3.connect(
+            self.path,
+            cached_statements=256,
+            timeout=float(credentials.get("SQLITE_BUSY_TIMEOUT", 30))
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL;")
+        self.connection.execute("PRAGMA synchronous=NORMAL;")
+        self.connection.execute("PRAGMA temp_store=MEMORY;")
+        self.connection.execute(f"PRAGMA cache_size={-int(credentials.get('SQLITE_CACHE_MB', 256)) * 1024};")  # noqa: E501
+        self.connection.execute("PRAGMA foreign_keys=ON;")
+        self.cursor = self.connection.cursor()
+        logger.info(f"Connection to sqlite database {self.path} established.")
+
+    def create_tables(self, recreate: bool) -> None:
+        """
+        Create tables and the indexes validation relies on.
+        """
+        if recreate:
+            logger.info("Dropping existing tables...")
+            for table in reversed(list(SQLITE_TABLES)):
+                self.cursor.execute(f"DROP TABLE IF EXISTS {table};")
+            self.max_rowids = {}
+
+        for table, ddl in SQLITE_TABLES.items():
+            logger.info(f"Creating {table} if not exists...")
+            self.cursor.execute(ddl)
+        for index in SQLITE_INDEXES:
+            self.cursor.execute(index)
+        self.connection.commit()
+
+    def set_seed(self, seed: int, *path) -> None:
+        """
+        Seed row selection and id generation from the substream `path` of
+        `seed`. The number of existing users is mixed in, so a seeded run
+        against a populated database does not regenerate ids that are
+        already taken.
+        """
+        self.cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM users;")
+        self.random.seed(derive_seed(seed, "sqlite", *path, self.cursor.fetchone()[0]))  # noqa: E501
+
+    def set_shard(self, shard: int, shards: int) -> None:
+        """
+        Only create and pick users whose ids fall in `shard` of `shards`.
+        """
+        self.user_prefixes = shard_prefixes(shard, shards)
+        self.shard_bounds = shard_bounds(self.user_prefixes)
+
+    def _new_id(self) -> str:
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def enable_checkpoints(self) -> None:
+        """
+        Create the checkpoint table and only commit at checkpoints.
+        """
+        self.cursor.execute(SQLITE_CHECKPOINT_TABLE)
+        self.connection.commit()
+        self.checkpointing = True
+
+    def commit_checkpoint(self, name: str, position: int) -> None:
+        """
+        Record the checkpoint position and commit.
+        """
+        self.cursor.execute("""
+            INSERT INTO stream_checkpoints (name, position, modified_at)
+                VALUES (?, ?, datetime('now'))
+            ON CONFLICT (name) DO UPDATE
+                SET position = excluded.position, modified_at = excluded.modified_at;
+        """, (name, position))  # noqa: E501
+        self.connection.commit()
+
+    def committed_position(self, name: str) -> int | None:
+        """
+        Position of the last committed checkpoint, if any.
+        """
+        self.cursor.execute(
+            "SELECT position FROM stream_checkpoints WHERE name = ?;",
+            (name,)
+        )
+
+        results = self.cursor.fetchone()
+
+        return results[0] if results else None
+
+    def rollback(self) -> None:
+        """
+        Discard everything applied since the last commit.
+        """
+        if self.batcher is not None:
+            self.batcher.discard()
+        self.changes = []
+        self.max_rowids = {}
+        self.connection.rollback()
+        self.uncommitted = 0
+
+    def eligibility_counts(self) -> dict:
+        """
+        Count the entities each event depends on.
+        """
+        lower, upper = self.shard_bounds
+        self.cursor.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM users WHERE id BETWEEN :lower AND :upper),
+                (
+                    SELECT COUNT(*)
+                    FROM users
+                    WHERE id BETWEEN :lower AND :upper
+                    AND NOT EXISTS (
+                        SELECT 1
+                        FROM applications
+                        WHERE applications.user_id = users.id
+                    )
+                ),
+                (SELECT COUNT(*) FROM applications WHERE status = 'pending' AND user_id BETWEEN :lower AND :upper),
+                (SELECT COUNT(*) FROM balances WHERE user_id BETWEEN :lower AND :upper),
+                (SELECT COUNT(*) FROM balances WHERE amount > 0 AND user_id BETWEEN :lower AND :upper);
+        """, {"lower": lower, "upper": upper})  # noqa: E501
+
+        results = self.cursor.fetchone()
+
+        return {
+            "users": results[0],
+            "unapplied_users": results[1],
+            "pending_applications": results[2],
+            "balances": results[3],
+            "positive_balances": results[4],
+        }
+
+    def row_count(self, table: str) -> int:
+        self.cursor.execute(f"SELECT COUNT(*) FROM {table};")
+
+        return self.cursor.fetchone()[0]
+
+    def iter_balances(self):
+        """
+        Yield every `(user_id, amount)` in user id order.
+        """
+        cursor = self.connection.execute("""
+            SELECT user_id, amount
+            FROM balances
+            ORDER BY user_id;
+        """)
+        try:
+            for user_id, cents in cursor:
+                yield user_id, Decimal(cents) / 100
+        finally:
+            cursor.close()
+
+    def _random_row(
+        self,
+        table: str,
+        user_column: str,
+        columns: str,
+        condition: str = "1",
+        probes: int = SQLITE_RANDOM_PROBES
+    ) -> tuple | None:
+        """
+        Pick a random row of `table` whose `user_column` is in the shard
+        and that matches `condition`.
+
+        Looks up to `probes` random rowids and takes the first that
+        matches, a uniform pick for one index lookup per probe. When none
+        matches, seeks to a random rowid and takes the first match from
+        there, wrapping around to the start, so rows that follow long runs
+        of non-matching rows are picked more often.
+
+        The id bound is written as `+id BETWEEN`, so that SQLite looks up
+        by rowid and filters on the id instead of scanning the id index.
+        """
+        max_rowid = self.max_rowids.get(table)
+        if max_rowid is None:
+            self.cursor.execute(f"SELECT COALESCE(max(rowid), 0) FROM {table};")  # noqa: E501
+            max_rowid = self.max_rowids[table] = self.cursor.fetchone()[0]
+        if not max_rowid:
+            return None
+
+        lower, upper = self.shard_bounds
+        query = f"""
+            SELECT {columns}
+            FROM {table}
+            WHERE rowid = ?
+            AND +{user_column} BETWEEN ? AND ?
+            AND {condition};
+        """
+        for _ in range(probes):
+            rowid = int(self.random.random() * max_rowid) + 1
+            self.cursor.execute(query, (rowid, lower, upper))
+            results = self.cursor.fetchone()
+            if results is not None:
+                return results
+
+        query = f"""
+            SELECT {columns}
+            FROM {table}
+            WHERE rowid >= ?
+            AND +{user_column} BETWEEN ? AND ?
+            AND {condition}
+            ORDER BY rowid
+            LIMIT 1;
+        """
+        for start in (int(self.random.random() * max_rowid) + 1, 0):
+            self.cursor.execute(query, (start, lower, upper))
+            results = self.cursor.fetchone()
+            if results is not None:
+                return results
+
+        return None
+
+    def validate_event(self, event: str) -> dict | EventFailedValidation:
+        """
+        Validate an event
+        """
+        if event == "user sign up":
+            validation = True
+        elif event == "user update demographic":
+            results = self._random_row("users", "id", "id, state")
+            validation = results and {"id": results[0], "state": results[1]}
+        elif event == "user application open":
+            results = self._random_row("users", "id", "id", """
+                NOT EXISTS (
+                    SELECT 1
+                    FROM applications
+                    WHERE applications.user_id = users.id
+                )
+            """)
+            validation = results and {"user_id": results[0]}
+        elif event in ("user application reject", "user application approve"):  # noqa: E501
+            # Pending applications are usually few, and the status index
+            # seeks straight to the next one, so skip the probes.
+            results = self._random_row(
+                "applications",
+                "user_id",
+                "user_id",
+                "status = 'pending'",
+                probes=0
+            )
+            validation = results and {"user_id": results[0]}
+        elif event == "user deposit":
+            results = self._random_row("balances", "user_id", "user_id, amount")  # noqa: E501
+            validation = results and {
+                "user_id": results[0],
+                "amount": Decimal(results[1]) / 100
+            }
+        elif event == "user withdraw":
+            results = self._random_row(
+                "balances",
+                "user_id",
+                "user_id, amount",
+                "amount > 0"
+            )
+            validation = results and {
+                "user_id": results[0],
+                "amount": Decimal(results[1]) / 100
+            }
+
+        if not validation:
+            raise EventFailedValidation(f"{event} failed validation.")
+
+        return validation
+
+    def _write(self, table: str, op: str, query: str, params: tuple, key: str | None = None) -> None:  # noqa: E501
+        """
+        Execute a write query. With a change sink, inserts (`op` "c")
+        return the new row and updates (`op` "u") read the row where the
+        `key` column matches the last parameter before the change too.
+        """
+        if self.cdc is None:
+            self.cursor.execute(query, params)
+        else:
+            before = None
+            if op == "u":
+                self.cursor.execute(f"SELECT * FROM {table} WHERE {key} = ?;", (params[-1],))  # noqa: E501
+                before = self._row()
+            self.cursor.execute(query.rstrip().rstrip(";") + " RETURNING *;", params)  # noqa: E501
+            self.changes.append((table, op, before, self._row()))
+
+        if op == "c" and table in self.max_rowids:
+            self.max_rowids[table] = self.cursor.lastrowid
+
+    def _row(self) -> dict:
+        """
+        Fetch a row as a dictionary, with amounts converted from cents.
+        """
+        names = [column[0] for column in self.cursor.description]
+        row = dict(zip(names, self.cursor.fetchone()))
+        if "amount" in row:
+            row["amount"] = Decimal(row["amount"]) / 100
+
+        return row
+
+    def insert_event(self, payload: dict) -> None:
+        event = payload["event"]
+        event_ts = payload["event_ts"]
+        write = self._write
+
+        if event == "user sign up":
+            write("users", "c", """
+                INSERT INTO users (id, first_name, last_name, email, dob, state, modified_at, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+            """, (  # noqa: E501
+                new_user_id(self.random, self.user_prefixes),
+                payload["first_name"],
+                payload["last_name"],
+                payload["email"],
+                payload["dob"],
+                payload["state"],
+                event_ts,
+                event_ts
+            ))
+        elif event == "user update demographic":
+            write("users", "u", """
+                UPDATE users
+                SET state = ?, modified_at = ?
+                WHERE id = ?;
+            """, (payload["state"], event_ts, payload["id"]), "id")
+        elif event == "user application open":
+            write("applications", "c", """
+                INSERT INTO applications (id, user_id, status, modified_at, created_at)
+                    VALUES (?, ?, ?, ?, ?);
+            """, (  # noqa: E501
+                self._new_id(),
+                payload["user_id"],
+                payload["status"],
+                event_ts,
+                event_ts
+            ))
+        elif event in ("user application reject", "user application approve"):  # noqa: E501
+            write("applications", "u", """
+                UPDATE applications
+                SET status = ?, modified_at = ?
+                WHERE user_id = ?;
+            """, (payload["status"], event_ts, payload["user_id"]), "user_id")  # noqa: E501
+
+            if event == "user application approve":
+                write("balances", "c", """
+                    INSERT INTO balances (id, user_id, amount, modified_at, created_at)
+                        VALUES (?, ?, 0, ?, ?);
+                """, (self._new_id(), payload["user_id"], event_ts, event_ts))  # noqa: E501
+        elif event in ("user deposit", "user withdraw"):
+            table = "deposits" if event == "user deposit" else "withdrawals"
+            cents = round(payload["amount"] * 100)
+            write(table, "c", f"""
+                INSERT INTO {table} (id, user_id, amount, created_at)
+                    VALUES (?, ?, ?, ?);
+            """, (self._new_id(), payload["user_id"], cents, event_ts))
+            write("balances", "u", """
+                UPDATE balances
+                SET amount = amount + ?, modified_at = ?
+                WHERE user_id = ?;
+            """, (
+                cents if event == "user deposit" else -cents,
+                event_ts,
+                payload["user_id"]
+            ), "user_id")
+
+        if self.cdc is not None:
+            self.cdc.commit(self.changes, event_ts)
+            self.changes = []
+
+        if self.batcher is not None:
+            self.batcher.add(event)
+        elif not self.checkpointing:
+            self.uncommitted += 1
+            if self.uncommitted >= self.batch_size:
+                self._flush_batch([])
+
+    def _flush_batch(self, items: list) -> None:
+        """
+        Commit the open transaction, unless checkpoints own the commits.
+        """
+        if not self.checkpointing:
+            self.connection.commit()
+        self.uncommitted = 0
+
+    def flush(self) -> None:
+        if self.batcher is not None:
+            self.batcher.flush()
+        elif not self.checkpointing:
+            self._flush_batch([])
+
+    def close_connection(self) -> None:
+        """
+        Commit and close connection.
+        """
+        self.flush()
+        if self.cdc is not None:
+            self.cdc.flush()
         self.cursor.close()
         self.connection.close()
 
 
+# Concurrent uploads per flushed batch when batching is enabled.
+S3_UPLOAD_WORKERS = 16
+
+
 class S3Target(Target):
     """
     S3 target.
     """
-    def __init__(self, credentials: dict) -> None:
+    def __init__(self, credentials: dict, prefix: str | None = None) -> None:
         """
         Connect to S3.
         """
         self.bucket_name = credentials["BUCKET_NAME"]
+        if prefix is None:
+            prefix = credentials.get("S3_PREFIX", "events/")
+        self.prefix = prefix
         try:
             session = boto3.Session(
                 aws_access_key_id=credentials["AWS_ACCESS_KEY_ID"],
                 aws_secret_access_key=credentials["AWS_SECRET_ACCESS_KEY"],
                 region_name=credentials["AWS_REGION"]
             )
-            self.client = session.client("s3")
+            self.session = session
+            self.executor = None
+            self.client = session.client(
+                "s3",
+                config=Config(max_pool_connections=S3_UPLOAD_WORKERS)
+            )
             self.resource = session.resource("s3").Bucket(self.bucket_name)
             logger.info("S3 client and bucket resource created.")
         except (NoCredentialsError, PartialCredentialsError) as err:
@@ -428,24 +1203,16 @@ class S3Target(Target):
         """
         Generate S3 key partitioned by `event_ts`.
         """
-        event_ts = payload["event_ts"]
-        filename = re.sub(r"[-:.]", "_", event_ts) + ".json"
-        date_partition = (
-            datetime
-            .strptime(
-                event_ts,
-                "%Y-%m-%dT%H:%M:%S.%f"
-            )
-            .strftime("%Y/%m/%d")
-        )
-        key_path = f"events/{date_partition}/{filename}"
-
-        return key_path
+        return event_key(self.prefix, payload)
 
     def write_event(self, payload: dict) -> None:
         """
         Write event to S3 bucket.
         """
+        if self.batcher is not None:
+            self.batcher.add(payload)
+            return
+
         key_path = self._generate_key(payload)
 
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -463,31 +1230,93 @@ class S3Target(Target):
                     self.bucket_name,
                     key_path
                 )
-                logger.info(f"Successfully loaded event record {key_path}")
+                sampled.info("write", "Successfully loaded event record %s", key_path)  # noqa: E501
             except (BotoCoreError, ClientError) as err:
                 logger.error(err)
 
-    def empty_bucket(self) -> None:
+    def _put_event(self, payload: dict) -> None:
+        key_path = self._generate_key(payload)
+        try:
+            self.client.put_object(
+                Bucket=self.bucket_name,
+                Key=key_path,
+                Body=json.dumps(payload).encode("utf-8")
+            )
+        except (BotoCoreError, ClientError) as err:
+            logger.error(err)
+
+    def _flush_batch(self, items: list[dict]) -> None:
+        """
+        Upload a batch of events, one object each, concurrently.
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(S3_UPLOAD_WORKERS)
+        list(self.executor.map(self._put_event, items))
+        sampled.info("write", "Successfully loaded %d event records", len(items))  # noqa: E501
+
+    def write_batch(self, records: list[dict], batch_id: str) -> None:
+        """
+        Write a batch of records to one NDJSON object.
+        """
+        key_path = partition_key(
+            self.prefix,
+            records[0]["event_ts"],
+            suffix=f"_{batch_id}"
+        )
+        body = "".join(json.dumps(record, default=str) + "\n" for record in records)  # noqa: E501
+
+        try:
+            self.client.put_object(
+                Bucket=self.bucket_name,
+                Key=key_path,
+                Body=body.encode("utf-8")
+            )
+            sampled.info("write", "Successfully loaded batch %s", key_path)
+        except (BotoCoreError, ClientError) as err:
+            logger.error(err)
+
+    def empty_bucket(self, workers: int = 16) -> dict:
         """
-        Empty S3 bucket
+        Delete every object under this target's prefix.
         """
-        self.resource.objects.all().delete()
-        self.resource.object_versions.all().delete()
-        logger.info(f"Emptied bucket: {self.bucket_name}")
+        client = self.session.client(
+            "s3",
+            config=Config(max_pool_connections=workers + 8)
+        )
+
+        return BulkDeleter(
+            client,
+            self.bucket_name,
+            prefix=self.prefix,
+            workers=workers
+        ).run()
+
+
+# Firehose accepts at most 500 records per PutRecordBatch call.
+FIREHOSE_BATCH_SIZE = 500
+FIREHOSE_MAX_RETRIES = 3
 
 
 class FirehoseTarget(Target):
     """Firehose target."""
-    def __init__(self, credentials: dict) -> None:
-        """Connect to firehose."""
+    def __init__(self, credentials: dict, prefix: str | None = None) -> None:
+        """
+        Connect to firehose. `prefix` is the S3 prefix the delivery stream
+        writes under and only scopes `empty_bucket`.
+        """
         self.stream_name = credentials["STREAM_NAME"]
         self.firehose_target_bucket_name = credentials["FIREHOSE_TARGET_BUCKET_NAME"]  # noqa: E501
+        if prefix is None:
+            prefix = credentials.get("FIREHOSE_TARGET_PREFIX", "")
+        self.firehose_target_prefix = prefix
         try:
             session = boto3.Session(
                 aws_access_key_id=credentials["AWS_ACCESS_KEY_ID"],
                 aws_secret_access_key=credentials["AWS_SECRET_ACCESS_KEY"],
                 region_name=credentials["AWS_REGION"]
             )
+            self.session = session
+            self.batches_sent = 0
             self.firehose_client = session.client("firehose")
             self.s3_client = session.client("s3")
             self.s3_resource = session.resource("s3").Bucket(self.firehose_target_bucket_name)  # noqa: E501
@@ -497,6 +1326,10 @@ class FirehoseTarget(Target):
 
     def write_event(self, payload: dict) -> None:
         """Write a record to Firehose."""
+        if self.batcher is not None:
+            self.batcher.add(payload)
+            return
+
         data = json.dumps(payload) + "\n"
 
         try:
@@ -506,14 +1339,355 @@ class FirehoseTarget(Target):
                     'Data': data.encode("utf-8")
                 }
             )
-            print(f"Record sent to Firehose: {response}")
+            sampled.info("write", "Record sent to Firehose: %s", response)
         except (NoCredentialsError, PartialCredentialsError):
-            print("Error: AWS credentials not found.")
+            logger.error("AWS credentials not found.")
         except Exception as e:
-            print(f"Error sending record to Firehose: {e}")
+            logger.error(f"Error sending record to Firehose: {e}")
+
+    def _flush_batch(self, items: list[dict]) -> None:
+        self.batches_sent += 1
+        self.write_batch(items, str(self.batches_sent))
+
+    def write_batch(self, records: list[dict], batch_id: str) -> None:
+        """Write records to Firehose in batches of at most 500."""
+        pending = [
+            {"Data": (json.dumps(record, default=str) + "\n").encode("utf-8")}
+            for record in records
+        ]
+
+        for start in range(0, len(pending), FIREHOSE_BATCH_SIZE):
+            chunk = pending[start:start + FIREHOSE_BATCH_SIZE]
+            for _ in range(FIREHOSE_MAX_RETRIES + 1):
+                try:
+                    response = self.firehose_client.put_record_batch(
+                        DeliveryStreamName=self.stream_name,
+                        Records=chunk
+                    )
+                except (BotoCoreError, ClientError) as err:
+                    logger.error(f"Error sending batch {batch_id} to Firehose: {err}")  # noqa: E501
+                    break
+
+                if not response["FailedPutCount"]:
+                    break
+                chunk = [
+                    record
+                    for record, result in zip(chunk, response["RequestResponses"])  # noqa: E501
+                    if "ErrorCode" in result
+                ]
+            else:
+                logger.error(f"{len(chunk)} records of batch {batch_id} were not delivered to Firehose")  # noqa: E501
+
+        sampled.info("write", "Batch %s sent to Firehose", batch_id)
+
+    def empty_bucket(self, workers: int = 16) -> dict:
+        """Delete every object under the delivery stream's S3 prefix."""
+        client = self.session.client(
+            "s3",
+            config=Config(max_pool_connections=workers + 8)
+        )
+
+        return BulkDeleter(
+            client,
+            self.firehose_target_bucket_name,
+            prefix=self.firehose_target_prefix,
+            workers=workers
+        ).run()
+
+
+class LocalTarget(Target):
+    """
+    Local directory target, laid out like the S3 bucket.
+    """
+    def __init__(self, credentials: dict, prefix: str | None = None) -> None:
+        """
+        Resolve the output directory.
+        """
+        self.root = Path(credentials.get("LOCAL_DIR", "output"))
+        if prefix is None:
+            prefix = credentials.get("S3_PREFIX", "events/")
+        self.prefix = prefix
+
+    def write_event(self, payload: dict) -> None:
+        """
+        Write event to its own file.
+        """
+        if self.batcher is not None:
+            self.batcher.add(payload)
+            return
+
+        self._write_file(payload)
+
+    def _flush_batch(self, items: list[dict]) -> None:
+        for payload in items:
+            self._write_file(payload)
+
+    def _write_file(self, payload: dict) -> None:
+        path = self.root / event_key(self.prefix, payload)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as file:
+            json.dump(payload, file, default=str)
+
+    def write_batch(self, records: list[dict], batch_id: str) -> None:
+        """
+        Write a batch of records to one NDJSON file.
+        """
+        path = self.root / partition_key(
+            self.prefix,
+            records[0]["event_ts"],
+            suffix=f"_{batch_id}"
+        )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as file:
+            for record in records:
+                file.write(json.dumps(record, default=str) + "\n")
 
     def empty_bucket(self) -> None:
-        """Empty S3 bucket."""
-        self.s3_resource.objects.all().delete()
-        self.s3_resource.object_versions.all().delete()
-        logger.info(f"Emptied bucket: {self.firehose_target_bucket_name}")
+        """
+        Delete everything under this target's prefix.
+        """
+        shutil.rmtree(self.root / self.prefix, ignore_errors=True)
+        logger.info(f"Emptied directory: {self.root / self.prefix}")
+
+
+class _IndexedSet:
+    """
+    Set with O(1) add, remove and uniform random choice.
+    """
+    def __init__(self) -> None:
+        self.items = []
+        self.positions = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def add(self, item) -> None:
+        if item not in self.positions:
+            self.positions[item] = len(self.items)
+            self.items.append(item)
+
+    def discard(self, item) -> None:
+        position = self.positions.pop(item, None)
+        if position is None:
+            return
+
+        last = self.items.pop()
+        if position < len(self.items):
+            self.items[position] = last
+            self.positions[last] = position
+
+    def choice(self, rng: random.Random):
+        return self.items[rng.randrange(len(self.items))] if self.items else None  # noqa: E501
+
+
+class MemoryTarget(Target):
+    """
+    In-process model of the Postgres tables.
+
+    Applies the same validation and state transitions as `PostgresTarget`
+    against dictionaries, so events (and their change records) can be
+    generated without a database. Every change is passed as a
+    `(table, op, before, after)` tuple to `cdc`, one transaction per
+    event, when a change sink is configured.
+
+    Every row stays in memory for the life of the target, about 1 KiB per
+    signed up user including their application and balance. At full
+    speed (roughly a third of events are sign ups) that is tens of GiB
+    per hour, so long runs should use `SQLiteTarget` or `PostgresTarget`
+    with a change sink instead.
+    """
+    def __init__(
+        self,
+        credentials: dict | None = None,
+        seed: int | None = None,
+        cdc=None
+    ) -> None:
+        """
+        Create empty tables.
+        """
+        self.random = random.Random(seed)
+        self.cdc = cdc
+        self.create_tables(recreate=True)
+
+    def create_tables(self, recreate: bool) -> None:
+        """
+        Reset the tables. The model has no persistent state, so this always
+        starts empty.
+        """
+        self.users = {}
+        self.applications = {}
+        self.balances = {}
+        self.unapplied_users = _IndexedSet()
+        self.pending_applications = _IndexedSet()
+        self.user_ids = _IndexedSet()
+        self.balance_users = _IndexedSet()
+        self.positive_balances = _IndexedSet()
+
+    def set_seed(self, seed: int, *path) -> None:
+        """
+        Reseed row selection from the substream `path` of `seed`.
+        """
+        self.random.seed(derive_seed(seed, "memory", *path))
+
+    def _new_id(self) -> str:
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def eligibility_counts(self) -> dict:
+        """
+        Count the entities each event depends on.
+        """
+        return {
+            "users": len(self.user_ids),
+            "unapplied_users": len(self.unapplied_users),
+            "pending_applications": len(self.pending_applications),
+            "balances": len(self.balance_users),
+            "positive_balances": len(self.positive_balances),
+        }
+
+    def validate_event(self, event: str) -> dict | EventFailedValidation:
+        """
+        Validate an event
+        """
+        if event == "user sign up":
+            validation = True
+        elif event == "user update demographic":
+            user_id = self.user_ids.choice(self.random)
+            validation = user_id and {
+                "id": user_id,
+                "state": self.users[user_id]["state"]
+            }
+        elif event == "user application open":
+            user_id = self.unapplied_users.choice(self.random)
+            validation = user_id and {"user_id": user_id}
+        elif event in ("user application reject", "user application approve"):  # noqa: E501
+            user_id = self.pending_applications.choice(self.random)
+            validation = user_id and {"user_id": user_id}
+        elif event == "user deposit":
+            user_id = self.balance_users.choice(self.random)
+            validation = user_id and {
+                "user_id": user_id,
+                "amount": self.balances[user_id]["amount"]
+            }
+        elif event == "user withdraw":
+            user_id = self.positive_balances.choice(self.random)
+            validation = user_id and {
+                "user_id": user_id,
+                "amount": self.balances[user_id]["amount"]
+            }
+
+        if not validation:
+            raise EventFailedValidation(f"{event} failed validation.")
+
+        return validation
+
+    def _update(self, table: dict, key: str, changes: dict, name: str, log: list) -> dict:  # noqa: E501
+        before = table[key]
+        after = {**before, **changes}
+        table[key] = after
+        log.append((name, "u", before, after))
+
+        return after
+
+    def _set_balance(self, payload: dict, delta: Decimal, log: list) -> None:
+        user_id = payload["user_id"]
+        balance = self._update(
+            self.balances,
+            user_id,
+            {
+                "amount": self.balances[user_id]["amount"] + delta,
+                "modified_at": payload["event_ts"]
+            },
+            "balances",
+            log
+        )
+        if balance["amount"] > 0:
+            self.positive_balances.add(user_id)
+        else:
+            self.positive_balances.discard(user_id)
+
+    def insert_event(self, payload: dict) -> None:
+        event = payload["event"]
+        event_ts = payload["event_ts"]
+        log = []
+
+        if event == "user sign up":
+            row = {
+                "id": self._new_id(),
+                "first_name": payload["first_name"],
+                "last_name": payload["last_name"],
+                "email": payload["email"],
+                "dob": payload["dob"],
+                "state": payload["state"],
+                "modified_at": event_ts,
+                "created_at": event_ts,
+            }
+            self.users[row["id"]] = row
+            self.user_ids.add(row["id"])
+            self.unapplied_users.add(row["id"])
+            log.append(("users", "c", None, row))
+        elif event == "user update demographic":
+            self._update(
+                self.users,
+                payload["id"],
+                {"state": payload["state"], "modified_at": event_ts},
+                "users",
+                log
+            )
+        elif event == "user application open":
+            row = {
+                "id": self._new_id(),
+                "user_id": payload["user_id"],
+                "status": payload["status"],
+                "modified_at": event_ts,
+                "created_at": event_ts,
+            }
+            self.applications[row["user_id"]] = row
+            self.unapplied_users.discard(row["user_id"])
+            self.pending_applications.add(row["user_id"])
+            log.append(("applications", "c", None, row))
+        elif event in ("user application reject", "user application approve"):  # noqa: E501
+            self._update(
+                self.applications,
+                payload["user_id"],
+                {"status": payload["status"], "modified_at": event_ts},
+                "applications",
+                log
+            )
+            self.pending_applications.discard(payload["user_id"])
+
+            if event == "user application approve":
+                row = {
+                    "id": self._new_id(),
+                    "user_id": payload["user_id"],
+                    "amount": Decimal("0.00"),
+                    "modified_at": event_ts,
+                    "created_at": event_ts,
+                }
+                self.balances[row["user_id"]] = row
+                self.balance_users.add(row["user_id"])
+                log.append(("balances", "c", None, row))
+        elif event in ("user deposit", "user withdraw"):
+            table = "deposits" if event == "user deposit" else "withdrawals"
+            amount = Decimal(str(payload["amount"]))
+            row = {
+                "id": self._new_id(),
+                "user_id": payload["user_id"],
+                "amount": amount,
+                "created_at": event_ts,
+            }
+            log.append((table, "c", None, row))
+            self._set_balance(
+                payload,
+                amount if event == "user deposit" else -amount,
+                log
+            )
+
+        if self.cdc is not None:
+            self.cdc.commit(log, event_ts)
+
+    def close_connection(self) -> None:
+        """
+        Flush buffered change records.
+        """
+        if self.cdc is not None:
+            self.cdc.flush()
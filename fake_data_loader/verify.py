@@ -0,0 +1,324 @@
+import itertools
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait  # noqa: E501
+from decimal import Decimal
+from pathlib import Path
+
+from exceptions import VerificationFailed
+from logger import logger
+
+
+# Users are partitioned by the first two hex characters of their uuid,
+# which is also the order the targets sort user ids in.
+PARTITIONS = [f"{value:02x}" for value in range(256)]
+
+# Chunks each worker may have queued, bounding memory to O(workers)
+# chunks of keys however large the log is.
+MAX_IN_FLIGHT_PER_WORKER = 2
+
+# Event type -> table whose row count it should match.
+EVENT_ROW_COUNTS = {
+    "user sign up": "users",
+    "user application open": "applications",
+    "user application approve": "balances",
+    "user deposit": "deposits",
+    "user withdraw": "withdrawals",
+}
+
+
+class LocalEventLog:
+    """
+    NDJSON event log in a local directory, as written by `LocalTarget`.
+    """
+    def __init__(self, root: Path, prefix: str = "events/") -> None:
+        self.root = root
+        self.prefix = prefix
+
+    def iter_keys(self):
+        """
+        Yield every key as the directory walk finds it.
+        """
+        for directory, _, filenames in os.walk(self.root / self.prefix):
+            for filename in filenames:
+                if filename.endswith(".json"):
+                    yield os.path.join(directory, filename)
+
+    def read_lines(self, key: str):
+        with open(key, "r", encoding="utf-8") as file:
+            yield from file
+
+
+class S3EventLog:
+    """
+    NDJSON event log in S3, as written by `S3Target`.
+
+    The client is created lazily so the log can be sent to worker
+    processes.
+    """
+    def __init__(self, credentials: dict, prefix: str | None = None) -> None:
+        self.credentials = credentials
+        self.bucket_name = credentials["BUCKET_NAME"]
+        if prefix is None:
+            prefix = credentials.get("S3_PREFIX", "events/")
+        self.prefix = prefix
+        self._client = None
+
+    def __getstate__(self) -> dict:
+        return {**self.__dict__, "_client": None}
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.Session(
+                aws_access_key_id=self.credentials["AWS_ACCESS_KEY_ID"],
+                aws_secret_access_key=self.credentials["AWS_SECRET_ACCESS_KEY"],  # noqa: E501
+                region_name=self.credentials["AWS_REGION"]
+            ).client("s3")
+
+        return self._client
+
+    def iter_keys(self):
+        """
+        Yield every key, one listing page at a time.
+        """
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=self.prefix):  # noqa: E501
+            for item in page.get("Contents", []):
+                yield item["Key"]
+
+    def read_lines(self, key: str):
+        response = self.client.get_object(Bucket=self.bucket_name, Key=key)
+        for line in response["Body"].iter_lines():
+            yield line.decode("utf-8")
+
+
+def _spill(aggregates: dict, spill_dir: Path) -> None:
+    """
+    Append per-user partial sums to this worker's spill file of their
+    partition, so there are at most `workers` files per partition.
+    """
+    by_partition = {}
+    for user_id, (deposits, withdrawals) in aggregates.items():
+        by_partition.setdefault(user_id[:2], []).append(
+            f"{user_id}\t{deposits}\t{withdrawals}\n"
+        )
+
+    for partition, lines in by_partition.items():
+        path = spill_dir / partition / f"{os.getpid()}.tsv"
+        with path.open("a", encoding="utf-8") as file:
+            file.writelines(lines)
+
+
+def _fold_chunk(
+    event_log,
+    keys: list[str],
+    spill_dir: Path,
+    max_entries: int
+) -> Counter:
+    """
+    Fold the events in `keys` into per-user deposit and withdrawal sums,
+    spilling to disk whenever more than `max_entries` users are held.
+    Returns the number of events per type.
+    """
+    counts = Counter()
+    aggregates = {}
+
+    for key in keys:
+        for line in event_log.read_lines(key):
+            if not line.strip():
+                continue
+
+            payload = json.loads(line)
+            event = payload["event"]
+            counts[event] += 1
+            if event not in ("user deposit", "user withdraw"):
+                continue
+
+            sums = aggregates.get(payload["user_id"])
+            if sums is None:
+                sums = aggregates[payload["user_id"]] = [Decimal(0), Decimal(0)]  # noqa: E501
+            sums[event == "user withdraw"] += Decimal(str(payload["amount"]))  # noqa: E501
+
+            if len(aggregates) >= max_entries:
+                _spill(aggregates, spill_dir)
+                aggregates = {}
+
+    _spill(aggregates, spill_dir)
+
+    return counts
+
+
+def _load_partition(spill_dir: Path) -> dict:
+    """
+    Sum every spill file of one partition into user -> net balance.
+    """
+    balances = {}
+    for path in spill_dir.glob("*.tsv"):
+        with path.open("r", encoding="utf-8") as file:
+            for line in file:
+                user_id, deposits, withdrawals = line.rstrip("\n").split("\t")
+                balances[user_id] = (
+                    balances.get(user_id, Decimal(0))
+                    + Decimal(deposits)
+                    - Decimal(withdrawals)
+                )
+
+    return balances
+
+
+class Verifier:
+    """
+    Reconcile the tables of a `PostgresTarget` or `SQLiteTarget` against
+    an emitted event log.
+
+    The log is folded in parallel chunks into per-user deposit and
+    withdrawal sums. Keys are streamed from the log into chunks of
+    `chunk_size`, with at most `MAX_IN_FLIGHT_PER_WORKER` chunks per
+    worker queued. Partial sums are spilled to per-partition files, so
+    memory is bounded by `max_entries` per worker plus one partition
+    during the merge. Balances are then streamed from the target in user
+    id order and merged partition by partition.
+    """
+    def __init__(
+        self,
+        event_log,
+        target,
+        workers: int = 4,
+        chunk_size: int = 1000,
+        max_entries: int = 100000,
+        max_reported: int = 20,
+        spill_dir: Path | None = None
+    ) -> None:
+        self.event_log = event_log
+        self.target = target
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_entries = max_entries
+        self.max_reported = max_reported
+        self.spill_dir = spill_dir
+
+    def _chunks(self):
+        keys = self.event_log.iter_keys()
+        while chunk := list(itertools.islice(keys, self.chunk_size)):
+            yield chunk
+
+    def _fold(self, spill_dir: Path) -> Counter:
+        counts = Counter()
+        started = time.perf_counter()
+        folded = 0
+
+        def collect(futures: set, return_when: str) -> set:
+            nonlocal folded
+            done, pending = wait(futures, return_when=return_when)
+            for future in done:
+                counts.update(future.result())
+            folded += len(done)
+            events = sum(counts.values())
+            logger.info(
+                "Folded %d chunks, %d events (%.0f events/s)",
+                folded,
+                events,
+                events / (time.perf_counter() - started)
+            )
+
+            return pending
+
+        with ProcessPoolExecutor(self.workers) as executor:
+            in_flight = set()
+            for chunk in self._chunks():
+                if len(in_flight) >= self.workers * MAX_IN_FLIGHT_PER_WORKER:  # noqa: E501
+                    in_flight = collect(in_flight, FIRST_COMPLETED)
+                in_flight.add(executor.submit(
+                    _fold_chunk,
+                    self.event_log,
+                    chunk,
+                    spill_dir,
+                    self.max_entries
+                ))
+            collect(in_flight, ALL_COMPLETED)
+
+        return counts
+
+    def _compare_balances(self, spill_dir: Path, report: dict) -> None:
+        rows = self.target.iter_balances()
+        row = next(rows, None)
+        try:
+            for partition in PARTITIONS:
+                expected = _load_partition(spill_dir / partition)
+
+                while row is not None and row[0][:2] == partition:
+                    user_id, amount = row
+                    report["balances_checked"] += 1
+                    net = expected.pop(user_id, Decimal(0))
+                    if net != amount:
+                        self._mismatch(report, "balance", user_id, net, amount)  # noqa: E501
+                    row = next(rows, None)
+
+                for user_id, net in expected.items():
+                    self._mismatch(report, "missing balance", user_id, net, None)  # noqa: E501
+        finally:
+            rows.close()
+
+    def _mismatch(self, report: dict, kind: str, key: str, expected, actual) -> None:  # noqa: E501
+        report["mismatches"] += 1
+        if len(report["examples"]) < self.max_reported:
+            report["examples"].append({
+                "kind": kind,
+                "key": key,
+                "expected": str(expected),
+                "actual": None if actual is None else str(actual),
+            })
+
+    def run(self) -> dict:
+        """
+        Reconcile and return the report. Raises VerificationFailed when
+        any mismatch is found.
+        """
+        started = time.perf_counter()
+        report = {
+            "events": 0,
+            "balances_checked": 0,
+            "mismatches": 0,
+            "examples": [],
+        }
+
+        with tempfile.TemporaryDirectory(dir=self.spill_dir) as temp_dir:
+            spill_dir = Path(temp_dir)
+            for partition in PARTITIONS:
+                (spill_dir / partition).mkdir()
+
+            counts = self._fold(spill_dir)
+            report["events"] = sum(counts.values())
+
+            for event, table in EVENT_ROW_COUNTS.items():
+                rows = self.target.row_count(table)
+                if rows != counts[event]:
+                    self._mismatch(report, "row count", table, counts[event], rows)  # noqa: E501
+
+            self._compare_balances(spill_dir, report)
+
+        elapsed = time.perf_counter() - started
+        report["elapsed_s"] = elapsed
+        report["events_per_s"] = report["events"] / elapsed if elapsed else 0.0  # noqa: E501
+        logger.info(
+            "Verified %d events and %d balances in %.1fs (%.0f events/s): %d mismatches",  # noqa: E501
+            report["events"],
+            report["balances_checked"],
+            elapsed,
+            report["events_per_s"],
+            report["mismatches"]
+        )
+
+        if report["mismatches"]:
+            raise VerificationFailed(
+                f"{report['mismatches']} mismatches between the event log and {type(self.target).__name__}",  # noqa: E501
+                report
+            )
+
+        return report
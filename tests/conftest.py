@@ -0,0 +1,34 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from auth_handler import AuthHandler
+from targets import PostgresTarget, SQLiteTarget
+
+
+@pytest.fixture
+def postgres_credentials() -> dict:
+    """
+    Credentials from the config file in FAKE_DATA_LOADER_TEST_PG_CONFIG.
+    The tests drop and recreate the tables in that database.
+    """
+    config_path = os.environ.get("FAKE_DATA_LOADER_TEST_PG_CONFIG")
+    if not config_path:
+        pytest.skip("FAKE_DATA_LOADER_TEST_PG_CONFIG is not set")
+
+    return AuthHandler().convert_to_dict(Path(config_path))
+
+
+@pytest.fixture
+def postgres_target(postgres_credentials):
+    target = PostgresTarget(postgres_credentials)
+    yield target
+    target.close_connection()
+
+
+@pytest.fixture
+def sqlite_target():
+    target = SQLiteTarget({"SQLITE_PATH": ":memory:"})
+    yield target
+    target.close_connection()
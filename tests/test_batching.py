@@ -0,0 +1,236 @@
+from collections import Counter
+from decimal import Decimal
+
+import pytest
+
+from batching import AdaptiveBatcher, AimdController
+from eligibility import EligibilityTracker
+from event_generator import EventGenerator
+from stream import StreamRunner
+from targets import LocalTarget, PostgresTarget
+from verify import EVENT_ROW_COUNTS, LocalEventLog, Verifier
+
+
+class FlushFailed(Exception):
+    pass
+
+
+class ScriptedCursor:
+    """
+    Cursor answering each validation query with the next scripted row.
+    """
+    def __init__(self, rows: list) -> None:
+        self.rows = rows
+        self.executed = []
+
+    def execute(self, query: str, params=None) -> None:
+        self.executed.append(query)
+
+    def fetchone(self):
+        return self.rows.pop(0)
+
+
+def _batched_postgres(rows: list, buffered: list[str]) -> PostgresTarget:
+    """
+    A PostgresTarget without a connection, with `buffered` users' writes
+    waiting in its batch.
+    """
+    target = PostgresTarget.__new__(PostgresTarget)
+    target.cursor = ScriptedCursor(rows)
+    target.shard_bounds = ("lower", "upper")
+    target.pending_users = set(buffered)
+    target.enable_batching(AimdController(min_batch=100, max_batch=100))
+    target.batcher.buffer = [f"UPDATE {user_id};" for user_id in buffered]
+
+    return target
+
+
+def test_fast_flush_increases_additively():
+    controller = AimdController(target_p99=0.1, increase=8, min_batch=1)
+
+    for expected in (9, 17, 25):
+        controller.observe(size=10, latency=0.01)
+        assert controller.batch_size == expected
+    assert controller.flush_interval == pytest.approx(0.09)
+
+
+def test_slow_flush_decreases_multiplicatively():
+    controller = AimdController(target_p99=0.1, decrease=0.5, min_batch=1)
+    controller.batch_size = 64
+
+    controller.observe(size=64, latency=0.2)
+
+    assert controller.batch_size == 32
+    assert not controller.latencies
+    controller.observe(size=32, latency=0.01)
+    assert controller.batch_size == 40
+
+
+def test_throughput_goal_backs_off_when_throughput_drops():
+    controller = AimdController(goal="throughput", increase=8, decrease=0.5)
+
+    controller.observe(size=100, latency=0.1)
+    assert controller.batch_size == 9
+    controller.observe(size=100, latency=0.5)
+    assert controller.batch_size == 4.5
+
+
+def test_batch_size_is_clamped():
+    controller = AimdController(target_p99=0.1, min_batch=4, max_batch=20)
+
+    for _ in range(10):
+        controller.observe(size=1, latency=0.01)
+    assert controller.batch_size == 20
+
+    for _ in range(10):
+        controller.observe(size=1, latency=1.0)
+    assert controller.batch_size == 4
+
+    controller.fail()
+    assert controller.batch_size == 4
+
+
+def test_unknown_goal_is_rejected():
+    with pytest.raises(ValueError):
+        AimdController(goal="cost")
+
+
+def test_batcher_flushes_at_batch_size():
+    flushed = []
+    batcher = AdaptiveBatcher("test", flushed.append, AimdController(min_batch=3, max_batch=3))  # noqa: E501
+
+    for item in range(7):
+        batcher.add(item)
+
+    assert flushed == [[0, 1, 2], [3, 4, 5]]
+    assert batcher.buffer == [6]
+    batcher.flush()
+    assert flushed[-1] == [6]
+    assert batcher.metrics()["flushes"] == 3
+    assert batcher.metrics()["items"] == 7
+
+
+def test_batcher_flushes_after_interval():
+    flushed = []
+    controller = AimdController(min_batch=100, max_batch=100)
+    batcher = AdaptiveBatcher("test", flushed.append, controller)
+
+    batcher.add(0)
+    controller.flush_interval = 0
+    batcher.add(1)
+
+    assert flushed == [[0, 1]]
+
+
+def test_failed_flush_backs_off_and_keeps_the_batch():
+    calls = []
+
+    def flush(items: list) -> None:
+        calls.append(list(items))
+        if len(calls) == 1:
+            raise FlushFailed()
+
+    controller = AimdController(min_batch=1, max_batch=100, decrease=0.5)
+    controller.batch_size = 8
+    batcher = AdaptiveBatcher("test", flush, controller)
+    batcher.buffer = [1, 2]
+
+    with pytest.raises(FlushFailed):
+        batcher.flush()
+
+    assert controller.batch_size == 4
+    assert batcher.buffer == [1, 2]
+    batcher.flush()
+    assert calls == [[1, 2], [1, 2]]
+    assert batcher.buffer == []
+
+
+def test_pick_of_a_pending_user_flushes_and_picks_again():
+    target = _batched_postgres([("a",), ("b",)], buffered=["a"])
+
+    assert target._pick("SELECT id;") == ("b",)
+    assert target.cursor.executed == ["SELECT id;", "UPDATE a;", "SELECT id;"]  # noqa: E501
+    assert not target.batcher.buffer
+    assert not target.pending_users
+
+
+def test_empty_pick_flushes_and_picks_again():
+    target = _batched_postgres([None, ("a",)], buffered=["a"])
+
+    assert target._pick("SELECT id;") == ("a",)
+    assert target.cursor.executed == ["SELECT id;", "UPDATE a;", "SELECT id;"]  # noqa: E501
+
+
+def test_pick_of_a_flushed_user_keeps_the_batch():
+    target = _batched_postgres([("b",), None, None], buffered=["a"])
+
+    assert target._pick("SELECT id;") == ("b",)
+    assert target._pick("SELECT id;") is None
+    assert target.cursor.executed == ["SELECT id;", "SELECT id;", "UPDATE a;", "SELECT id;"]  # noqa: E501
+
+
+@pytest.mark.parametrize("fixture", ["sqlite_target", "postgres_target"])
+def test_batched_target_validates_against_buffered_state(request, fixture):
+    target = request.getfixturevalue(fixture)
+    target.create_tables(recreate=True)
+    target.enable_batching(AimdController(min_batch=200, max_batch=200))
+    event_generator = EventGenerator(
+        eligibility=EligibilityTracker(target.eligibility_counts())
+    )
+
+    counts = Counter()
+    balances = {}
+    for _ in range(3000):
+        event = event_generator.get_event()
+        validation = target.validate_event(event)
+        payload = event_generator.generate_event_payload(event, validation)
+        target.insert_event(payload)
+        event_generator.record(payload, validation)
+
+        counts[event] += 1
+        if event == "user application approve":
+            balances[payload["user_id"]] = Decimal(0)
+        elif event == "user deposit":
+            balances[payload["user_id"]] += Decimal(str(payload["amount"]))
+        elif event == "user withdraw":
+            balances[payload["user_id"]] -= Decimal(str(payload["amount"]))
+            assert balances[payload["user_id"]] >= 0
+    target.flush()
+
+    assert target.batcher.flushes > 1
+    for event, table in EVENT_ROW_COUNTS.items():
+        assert target.row_count(table) == counts[event]
+    assert dict(target.iter_balances()) == balances
+
+
+@pytest.mark.parametrize("stop_in", ["get_event", "write_event"])
+def test_interrupted_batched_run_keeps_target_and_log_consistent(sqlite_target, tmp_path, stop_in):  # noqa: E501
+    sqlite_target.create_tables(recreate=True)
+    sink = LocalTarget({"LOCAL_DIR": str(tmp_path)})
+    event_generator = EventGenerator(
+        seed=2,
+        eligibility=EligibilityTracker(sqlite_target.eligibility_counts())
+    )
+    for batched in (sqlite_target, sink):
+        batched.enable_batching(AimdController(min_batch=300, max_batch=300))  # noqa: E501
+    runner = StreamRunner(event_generator, sqlite_target, [sink])
+
+    owner = event_generator if stop_in == "get_event" else sink
+    original = getattr(owner, stop_in)
+    calls = 0
+
+    def interrupt_once(*args):
+        nonlocal calls
+        calls += 1
+        if calls == 1000:
+            raise KeyboardInterrupt()
+        return original(*args)
+
+    setattr(owner, stop_in, interrupt_once)
+    with pytest.raises(KeyboardInterrupt):
+        runner.run(60, 0)
+    sqlite_target.flush()
+
+    report = Verifier(LocalEventLog(tmp_path), sqlite_target, workers=1).run()  # noqa: E501
+    assert report["events"] == runner.applied
+    assert sqlite_target.batcher.buffer == sink.batcher.buffer == []
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from benchmark import Benchmark, prepare_sqlite
+from exceptions import BenchmarkRegression
+
+
+def _benchmark(throughputs: dict) -> Benchmark:
+    benchmark = Benchmark(duration=0.01, seed=0)
+    benchmark.results = {
+        name: {"throughput": throughput}
+        for name, throughput in throughputs.items()
+    }
+
+    return benchmark
+
+
+@pytest.fixture
+def baseline(tmp_path):
+    path = tmp_path / "baseline.json"
+    path.write_text(json.dumps({
+        "cases": {
+            "generator": {"throughput": 1000.0},
+            "postgres:0": {"throughput": 500.0},
+        }
+    }))
+
+    return path
+
+
+def test_compare_passes_within_tolerance(baseline):
+    _benchmark({"generator": 950.0, "postgres:0": 480.0}).compare(baseline, 0.1)  # noqa: E501
+
+
+def test_compare_fails_on_regression(baseline):
+    with pytest.raises(BenchmarkRegression) as err:
+        _benchmark({"generator": 800.0, "postgres:0": 500.0}).compare(baseline, 0.1)  # noqa: E501
+
+    assert err.value.regressions == {"generator": (1000.0, 800.0)}
+
+
+def test_compare_fails_on_missing_case(baseline):
+    with pytest.raises(BenchmarkRegression) as err:
+        _benchmark({"generator": 1000.0}).compare(baseline, 0.1)
+
+    assert err.value.regressions == {"postgres:0": (500.0, None)}
+    assert "postgres:0: 500.0 ops/s -> did not run" in err.value.message
+
+
+def test_compare_allows_missing_case_when_asked(baseline):
+    _benchmark({"generator": 1000.0}).compare(baseline, 0.1, allow_missing=True)  # noqa: E501
+
+
+def test_run_case_counts_only_useful_iterations():
+    calls = iter(range(10**9))
+    result = Benchmark(duration=0.05, seed=0).run_case(
+        "case",
+        lambda: next(calls) % 2 == 0
+    )
+
+    assert result["iterations"] >= result["ops"] > 0
+    assert result["throughput"] > 0
+
+
+def test_prepare_seeds_the_target_row_picks(sqlite_target):
+    def picks(seed: int) -> list[float]:
+        prepare_sqlite(sqlite_target, 100, seed)
+        return [sqlite_target.random.random() for _ in range(5)]
+
+    assert picks(1) == picks(1)
+    assert picks(1) != picks(2)
+    assert sqlite_target.row_count("users") == 100
@@ -0,0 +1,134 @@
+import threading
+
+import pytest
+
+from bulk_delete import DELETE_BATCH_SIZE, BulkDeleter
+
+
+moto = pytest.importorskip("moto")
+boto3 = pytest.importorskip("boto3")
+
+BUCKET_NAME = "fake-data-loader-test"
+
+
+class FlakyClient:
+    """
+    S3 client that records delete_objects batches and reports the keys in
+    `failing` as errors the first `failures` times they are deleted.
+
+    Calls are serialized because moto's backend is not thread safe.
+    """
+    def __init__(self, client, failing: set, failures: int = 1) -> None:
+        self.client = client
+        self.failing = {key: failures for key in failing}
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def get_paginator(self, operation: str):
+        paginator = self.client.get_paginator(operation)
+        lock = self.lock
+
+        class LockedPaginator:
+            def paginate(self, **kwargs):
+                pages = iter(paginator.paginate(**kwargs))
+                while True:
+                    with lock:
+                        page = next(pages, None)
+                    if page is None:
+                        return
+                    yield page
+
+        return LockedPaginator()
+
+    def delete_objects(self, Bucket: str, Delete: dict) -> dict:
+        with self.lock:
+            return self._delete_objects(Bucket, Delete)
+
+    def _delete_objects(self, Bucket: str, Delete: dict) -> dict:
+        objects = Delete["Objects"]
+        self.batches.append(len(objects))
+
+        errors = []
+        deletable = []
+        for item in objects:
+            if self.failing.get(item["Key"], 0):
+                self.failing[item["Key"]] -= 1
+                errors.append({**item, "Code": "SlowDown"})
+            else:
+                deletable.append(item)
+
+        if deletable:
+            self.client.delete_objects(
+                Bucket=Bucket,
+                Delete={**Delete, "Objects": deletable}
+            )
+
+        return {"Errors": errors} if errors else {}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET_NAME)
+        yield client
+
+
+def _put(client, keys: list[str]) -> None:
+    for key in keys:
+        client.put_object(Bucket=BUCKET_NAME, Key=key, Body=b"{}")
+
+
+def _keys(client) -> set[str]:
+    paginator = client.get_paginator("list_objects_v2")
+
+    return {
+        item["Key"]
+        for page in paginator.paginate(Bucket=BUCKET_NAME)
+        for item in page.get("Contents", [])
+    }
+
+
+def test_deletes_only_under_prefix_in_batches(client):
+    events = [f"events/2024/01/01/{index:05d}.json" for index in range(2100)]
+    events += [f"events/2024/01/02/{index:05d}.json" for index in range(10)]
+    kept = ["events-archive/2024/01/01/00000.json", "other/events/00000.json"]
+    _put(client, events + kept)
+
+    flaky = FlakyClient(client, failing=set())
+    stats = BulkDeleter(flaky, BUCKET_NAME, prefix="events/", workers=4).run()
+
+    assert stats == {**stats, "deleted": len(events), "failed": 0}
+    assert _keys(client) == set(kept)
+    assert max(flaky.batches) <= DELETE_BATCH_SIZE
+    assert sum(flaky.batches) == len(events)
+    assert len(flaky.batches) >= 3
+
+
+def test_retries_keys_returned_in_errors(client):
+    keys = [f"events/2024/01/01/{index:05d}.json" for index in range(20)]
+    _put(client, keys)
+
+    flaky = FlakyClient(client, failing=set(keys[:5]), failures=2)
+    stats = BulkDeleter(flaky, BUCKET_NAME, prefix="events/", workers=2).run()
+
+    assert stats["deleted"] == len(keys)
+    assert stats["failed"] == 0
+    assert _keys(client) == set()
+    assert flaky.batches == [20, 5, 5]
+
+
+def test_gives_up_after_max_retries(client):
+    keys = [f"events/2024/01/01/{index:05d}.json" for index in range(3)]
+    _put(client, keys)
+
+    flaky = FlakyClient(client, failing={keys[0]}, failures=10)
+    deleter = BulkDeleter(flaky, BUCKET_NAME, prefix="events/", max_retries=2)
+    stats = deleter.run()
+
+    assert stats["deleted"] == 2
+    assert stats["failed"] == 1
+    assert [item["Key"] for item in deleter.failed] == [keys[0]]
+    assert _keys(client) == {keys[0]}
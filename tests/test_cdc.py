@@ -0,0 +1,119 @@
+from decimal import Decimal
+
+import pytest
+from click.testing import CliRunner
+
+from cdc import CdcEmitter
+from cli import cli
+from eligibility import EligibilityTracker
+from event_generator import EventGenerator
+from targets import MemoryTarget, PostgresTarget, SQLiteTarget
+
+
+class ListSink:
+    def __init__(self) -> None:
+        self.batches = []
+
+    def write_batch(self, records: list[dict], batch_id: str) -> None:
+        self.batches.append((batch_id, list(records)))
+
+    @property
+    def records(self) -> list[dict]:
+        return [record for _, records in self.batches for record in records]
+
+
+def _run(target, count: int = 1500) -> None:
+    target.create_tables(recreate=True)
+    target.set_seed(3, 0)
+    event_generator = EventGenerator(
+        seed=3,
+        eligibility=EligibilityTracker(target.eligibility_counts())
+    )
+    for _ in range(count):
+        event = event_generator.get_event()
+        validation = target.validate_event(event)
+        payload = event_generator.generate_event_payload(event, validation)
+        target.insert_event(payload)
+        event_generator.record(payload, validation)
+    target.close_connection()
+
+
+def _check_records(records: list[dict]) -> None:
+    assert [record["lsn"] for record in records] == list(range(1, len(records) + 1))  # noqa: E501
+
+    transactions = {}
+    for record in records:
+        transactions.setdefault(record["txid"], []).append(record)
+    for changes in transactions.values():
+        lsns = [change["lsn"] for change in changes]
+        assert lsns == list(range(lsns[0], lsns[-1] + 1))
+        assert {change["commit_lsn"] for change in changes} == {lsns[-1]}
+
+    tables = {record["table"] for record in records}
+    assert {"users", "applications", "balances", "deposits"} <= tables
+
+    balances = {}
+    for record in records:
+        if record["op"] == "c":
+            assert record["before"] is None
+        else:
+            assert record["before"]["id"] == record["after"]["id"]
+
+        if record["table"] == "balances":
+            row = record["after"]
+            if record["op"] == "u":
+                assert Decimal(record["before"]["amount"]) == balances[row["user_id"]]  # noqa: E501
+            balances[row["user_id"]] = Decimal(row["amount"])
+            assert balances[row["user_id"]] >= 0
+
+
+def _target_records(make_target) -> list[dict]:
+    sink = ListSink()
+    _run(make_target(CdcEmitter([sink], batch_size=100)))
+
+    assert all(len(records) >= 100 for _, records in sink.batches[:-1])
+
+    return sink.records
+
+
+def test_memory_target_change_records():
+    _check_records(_target_records(lambda cdc: MemoryTarget(cdc=cdc)))
+
+
+def test_sqlite_target_change_records():
+    records = _target_records(
+        lambda cdc: SQLiteTarget({"SQLITE_PATH": ":memory:"}, cdc=cdc)
+    )
+
+    _check_records(records)
+    assert isinstance(records[-1]["after"].get("amount", Decimal(0)), Decimal)  # noqa: E501
+
+
+def test_postgres_target_change_records(postgres_credentials):
+    _check_records(_target_records(
+        lambda cdc: PostgresTarget(postgres_credentials, cdc=cdc)
+    ))
+
+
+@pytest.mark.parametrize("make_target", [
+    lambda cdc: MemoryTarget(cdc=cdc),
+    lambda cdc: SQLiteTarget({"SQLITE_PATH": ":memory:"}, cdc=cdc),
+])
+def test_one_transaction_per_event(make_target):
+    sink = ListSink()
+    target = make_target(CdcEmitter([sink], batch_size=1))
+    _run(target, count=200)
+
+    assert len({record["txid"] for record in sink.records}) == 200
+
+
+def test_cdc_stream_rejects_coordinator(tmp_path):
+    result = CliRunner().invoke(cli, [
+        "cdc-stream",
+        "--config-path", str(tmp_path / "missing.cfg"),
+        "--sink", "local",
+        "--coordinator", str(tmp_path / "coordinator.sock"),
+    ])
+
+    assert result.exit_code == 2
+    assert "--coordinator" in result.output
@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from checkpoint import Checkpointer
+from eligibility import EligibilityTracker
+from event_generator import EventGenerator
+from stream import StreamRunner
+from targets import LocalTarget, SQLiteTarget
+from verify import LocalEventLog, Verifier
+
+
+class SinkCrashed(Exception):
+    pass
+
+
+def _runner(tmp_path, state: dict | None = None) -> StreamRunner:
+    """
+    A checkpointed sqlite-stream writing to a local sink, resumed from
+    `state` when given.
+    """
+    target = SQLiteTarget({"SQLITE_PATH": str(tmp_path / "db.sqlite")})
+    target.create_tables(recreate=False)
+    target.enable_checkpoints()
+    runner = StreamRunner(
+        EventGenerator(
+            seed=5,
+            eligibility=EligibilityTracker(
+                target.eligibility_counts() if state is None else None
+            )
+        ),
+        target,
+        [LocalTarget({"LOCAL_DIR": str(tmp_path / "out")})],
+        checkpointer=Checkpointer(
+            tmp_path / "checkpoint.json",
+            interval=60,
+            max_events=200
+        )
+    )
+    if state is not None:
+        runner.restore(state)
+
+    return runner
+
+
+def _load(tmp_path) -> dict:
+    target = SQLiteTarget({"SQLITE_PATH": str(tmp_path / "db.sqlite")})
+    checkpointer = Checkpointer(tmp_path / "checkpoint.json")
+    try:
+        return checkpointer.load(target.committed_position(checkpointer.name))
+    finally:
+        target.close_connection()
+
+
+def test_checkpoint_spools_payloads_instead_of_embedding_them(tmp_path):
+    runner = _runner(tmp_path)
+    runner.run(0.3, 0)
+    runner.target.close_connection()
+
+    text = (tmp_path / "checkpoint.json").read_text()
+    state = json.loads(text)
+    spooled = list(runner.checkpointer.read_spool())
+
+    assert "pending" not in state
+    assert state["position"] > 200
+    assert state["spooled"] == len(spooled) <= 200
+    assert state["acked"] == {"LocalTarget": state["position"]}
+    assert "event_ts" not in text
+
+
+def test_resume_resends_unacknowledged_payloads(tmp_path):
+    runner = _runner(tmp_path)
+    sink = runner.sinks[0]
+    write_event = sink.write_event
+    written = 0
+
+    def crash_after_250(payload: dict) -> None:
+        nonlocal written
+        if written == 250:
+            raise SinkCrashed()
+        written += 1
+        write_event(payload)
+
+    sink.write_event = crash_after_250
+    with pytest.raises(SinkCrashed):
+        runner.run(10, 0)
+    runner.target.connection.close()
+
+    state = _load(tmp_path)
+    assert state["position"] == 400
+    assert state["acked"] == {"LocalTarget": 200}
+    assert len(list(LocalEventLog(tmp_path / "out").iter_keys())) == 250
+
+    resumed = _runner(tmp_path, state)
+    assert len(list(LocalEventLog(tmp_path / "out").iter_keys())) == 400
+    resumed.run(state["elapsed_s"] + 0.3, 0)
+
+    report = Verifier(
+        LocalEventLog(tmp_path / "out"),
+        resumed.target,
+        workers=1
+    ).run()
+    assert report["events"] == resumed.event_generator.events_generated
+    assert report["mismatches"] == 0
+    resumed.target.close_connection()
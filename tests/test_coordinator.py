@@ -0,0 +1,231 @@
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from coordinator import Coordinator, CoordinatorClient
+from exceptions import CoordinatorError
+from targets import SQLiteTarget, shard_bounds, shard_prefixes
+
+
+CLI = Path(__file__).parent.parent / "fake_data_loader" / "cli.py"
+
+
+@pytest.fixture
+def start(tmp_path):
+    """
+    Start a coordinator on a Unix socket, returning it and a factory for
+    connected clients. Everything is stopped at teardown.
+    """
+    servers, clients = [], []
+
+    def start(**kwargs):
+        server = Coordinator(str(tmp_path / "coordinator.sock"), **kwargs)
+        server.start()
+        servers.append(server)
+
+        def client(node: str, **client_kwargs) -> CoordinatorClient:
+            clients.append(CoordinatorClient(server.address, node=node, **client_kwargs))  # noqa: E501
+            return clients[-1]
+
+        return server, client
+
+    yield start
+
+    for client in clients:
+        client.close()
+    for server in servers:
+        server.stop()
+
+
+def test_leases_are_exclusive(start):
+    _, client = start(shards=2)
+    a, b, c = client("a"), client("b"), client("c")
+
+    assert a.lease()["shard"] == 0
+    assert b.lease()["shard"] == 1
+    with pytest.raises(CoordinatorError, match="All 2 shards are leased"):
+        c.lease()
+    with pytest.raises(CoordinatorError, match="Shard 0 is leased by a"):
+        c.lease(0)
+
+    assert a.lease(0)["shard"] == 0
+
+
+def test_lapsed_lease_is_taken_over(start):
+    _, client = start(shards=1, lease_ttl=0.2)
+    a, b = client("a"), client("b")
+    a.lease()
+
+    with pytest.raises(CoordinatorError):
+        b.lease()
+    time.sleep(0.3)
+    assert b.lease()["shard"] == 0
+
+    with pytest.raises(CoordinatorError, match="a no longer holds shard 0"):
+        a.heartbeat({"events": 1})
+
+
+def test_heartbeat_renews_lease(start):
+    _, client = start(shards=1, lease_ttl=0.3)
+    a, b = client("a"), client("b")
+    a.lease()
+
+    for _ in range(3):
+        time.sleep(0.15)
+        a.heartbeat({"events": 1})
+
+    with pytest.raises(CoordinatorError):
+        b.lease()
+
+
+def test_background_heartbeats_keep_a_blocked_node_leased(start):
+    server, client = start(shards=1, lease_ttl=0.3)
+    a, b = client("a", heartbeat_interval=0.05), client("b")
+    a.lease()
+
+    a.start_heartbeats(lambda: {"events": 7})
+    time.sleep(0.6)
+
+    with pytest.raises(CoordinatorError):
+        b.lease()
+    assert server.status()["nodes"]["a"]["events"] == 7
+    a.acquire()
+
+
+def test_lost_lease_is_raised_from_acquire(start):
+    server, client = start(shards=1)
+    a = client("a", heartbeat_interval=0.05)
+    a.lease()
+    a.start_heartbeats(lambda: {})
+
+    server.leases.clear()
+    time.sleep(0.2)
+
+    with pytest.raises(CoordinatorError, match="a no longer holds shard 0"):
+        a.acquire()
+
+
+def test_tokens_are_shared_at_the_global_rate(start):
+    _, client = start(shards=2, rate=200)
+    nodes = [client("a", token_batch=10), client("b", token_batch=10)]
+    for node in nodes:
+        node.lease()
+
+    def take(node: CoordinatorClient) -> None:
+        for _ in range(300):
+            node.acquire()
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=take, args=(node,)) for node in nodes]  # noqa: E501
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    # 600 tokens, the first 200 from the full bucket, the rest at 200/s.
+    assert 1.8 <= elapsed < 2.6
+
+
+def test_rates_below_one_per_second_grant_tokens():
+    server = Coordinator("unused.sock", rate=0.5)
+
+    response = server.handle({"op": "tokens", "count": 5})
+    assert response == {"granted": 1, "wait": 0.0}
+
+    response = server.handle({"op": "tokens", "count": 5})
+    assert response["granted"] == 0
+    assert response["wait"] == pytest.approx(2.0, abs=0.01)
+
+    server.refilled -= 2.0
+    assert server.handle({"op": "tokens", "count": 5})["granted"] == 1
+
+
+@pytest.mark.parametrize("rate", [0, -1.0])
+def test_rate_must_be_positive(rate):
+    with pytest.raises(ValueError, match="Rate must be positive"):
+        Coordinator("unused.sock", rate=rate)
+
+
+def test_status_sums_node_metrics(start):
+    server, client = start(shards=4)
+    nodes = [client(name) for name in ("a", "b", "c")]
+    for index, node in enumerate(nodes):
+        node.lease()
+        node.heartbeat({
+            "events": 100 * (index + 1),
+            "failed_validation": index,
+            "events_per_s": 10.0,
+        })
+    nodes[2].release({
+        "events": 400,
+        "failed_validation": 2,
+        "events_per_s": 10.0,
+    })
+
+    status = server.status()
+
+    assert status["active_leases"] == 2
+    assert status["leases"] == {0: "a", 1: "b"}
+    assert status["totals"] == {
+        "events": 700,
+        "failed_validation": 3,
+        "events_per_s": 20.0,
+    }
+    assert status["nodes"]["c"]["done"] is True
+
+
+def test_node_processes_share_one_sqlite_file(tmp_path):
+    database = tmp_path / "db.sqlite"
+    config = tmp_path / "sqlite.cfg"
+    config.write_text(f"SQLITE_PATH={database}\n")
+    target = SQLiteTarget({"SQLITE_PATH": str(database)})
+    target.create_tables(recreate=True)
+    target.close_connection()
+
+    rate, duration, shards = 300, 4, 3
+    server = Coordinator(str(tmp_path / "coordinator.sock"), shards=shards, rate=rate)  # noqa: E501
+    server.start()
+    try:
+        started = time.monotonic()
+        nodes = [
+            subprocess.Popen(
+                [
+                    sys.executable, str(CLI), "--log-level", "WARNING",
+                    "sqlite-stream",
+                    "--config-path", str(config),
+                    "--coordinator", server.address,
+                    "--duration", str(duration),
+                    "--event-lag", "0",
+                ],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True
+            )
+            for _ in range(shards)
+        ]
+        outputs = [node.communicate(timeout=60)[0] for node in nodes]
+        elapsed = time.monotonic() - started
+        status = server.status()
+    finally:
+        server.stop()
+
+    assert [node.returncode for node in nodes] == [0] * shards, outputs
+    events = [metrics["events"] for metrics in status["nodes"].values()]
+    assert len(events) == shards
+    assert min(events) > sum(events) / shards / 2
+    assert rate * duration / 2 < sum(events) <= rate * elapsed + rate
+
+    target = SQLiteTarget({"SQLITE_PATH": str(database)})
+    for shard in range(shards):
+        lower, upper = shard_bounds(shard_prefixes(shard, shards))
+        target.cursor.execute(
+            "SELECT COUNT(*) FROM users WHERE id BETWEEN ? AND ?;",
+            (lower, upper)
+        )
+        assert target.cursor.fetchone()[0] > 0
+    target.close_connection()
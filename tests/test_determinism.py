@@ -0,0 +1,107 @@
+import datetime
+import json
+
+import faker.providers.date_time
+import pytest
+
+from eligibility import EligibilityTracker
+from event_generator import EventGenerator
+from targets import MemoryTarget, SQLiteTarget
+
+
+def _payloads(target, seed: int, count: int) -> list[dict]:
+    """
+    Apply `count` seeded events to freshly recreated tables.
+    """
+    target.create_tables(recreate=True)
+    target.set_seed(seed, 0)
+    event_generator = EventGenerator(
+        seed=seed,
+        eligibility=EligibilityTracker(target.eligibility_counts())
+    )
+
+    payloads = []
+    while len(payloads) < count:
+        event = event_generator.get_event()
+        validation = target.validate_event(event)
+        payload = event_generator.generate_event_payload(event, validation)
+        target.insert_event(payload)
+        event_generator.record(payload, validation)
+        payloads.append(payload)
+    target.flush()
+
+    return payloads
+
+
+def _dump(payloads: list[dict]) -> str:
+    return json.dumps(payloads, default=str)
+
+
+def test_generator_substreams_are_reproducible_and_independent():
+    def events(stream: int) -> list:
+        event_generator = EventGenerator(seed=7, stream=stream, streams=2)
+        return [event_generator.get_event() for _ in range(200)]
+
+    assert events(0) == events(0)
+    assert events(0) != events(1)
+
+
+def _frozen_today(monkeypatch, today: datetime.date) -> None:
+    """
+    Make Faker's date providers see `today` as the current date.
+    """
+    class FrozenDatetime(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls.combine(today, datetime.time(12), tz)
+
+    monkeypatch.setattr(faker.providers.date_time, "datetime", FrozenDatetime)  # noqa: E501
+
+
+def test_seeded_sign_ups_do_not_depend_on_today(monkeypatch):
+    def dates_of_birth(today: datetime.date) -> list[str]:
+        _frozen_today(monkeypatch, today)
+        event_generator = EventGenerator(seed=3)
+        return [
+            event_generator.generate_event_payload("user sign up", True)["dob"]  # noqa: E501
+            for _ in range(50)
+        ]
+
+    first = dates_of_birth(datetime.date(2025, 3, 1))
+
+    assert first == dates_of_birth(datetime.date(2026, 10, 19))
+    assert all("1947-01-02" <= dob <= "2006-01-01" for dob in first)
+
+    _frozen_today(monkeypatch, datetime.date(2025, 3, 1))
+    unseeded = EventGenerator().generate_event_payload("user sign up", True)  # noqa: E501
+    assert "1949-03-02" <= unseeded["dob"] <= "2007-03-01"
+
+
+def test_memory_target_payloads_are_identical():
+    first = _payloads(MemoryTarget(), seed=11, count=2000)
+    second = _payloads(MemoryTarget(), seed=11, count=2000)
+
+    assert _dump(first) == _dump(second)
+    assert _dump(first) != _dump(_payloads(MemoryTarget(), seed=12, count=2000))  # noqa: E501
+
+
+@pytest.mark.parametrize("batch_sizes", [(1000, 1000), (1, 750)])
+def test_sqlite_target_payloads_are_identical(batch_sizes):
+    runs = []
+    for batch_size in batch_sizes:
+        target = SQLiteTarget({
+            "SQLITE_PATH": ":memory:",
+            "SQLITE_BATCH_SIZE": batch_size,
+        })
+        runs.append(_dump(_payloads(target, seed=11, count=2000)))
+        target.close_connection()
+
+    assert runs[0] == runs[1]
+
+
+def test_postgres_target_payloads_are_identical(postgres_target):
+    first = _payloads(postgres_target, seed=11, count=500)
+    second = _payloads(postgres_target, seed=11, count=500)
+
+    assert _dump(first) == _dump(second)
+    assert any("user_id" in payload for payload in first)
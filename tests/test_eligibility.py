@@ -0,0 +1,99 @@
+import json
+import random
+from collections import Counter
+from decimal import Decimal
+
+import pytest
+
+from eligibility import EVENT_REQUIREMENTS, EligibilityTracker
+from event_generator import EventGenerator
+from targets import MemoryTarget
+
+
+EVENTS = list(EVENT_REQUIREMENTS)
+
+WEIGHTS = EventGenerator().weights
+
+
+def test_choose_never_returns_an_ineligible_event():
+    rng = random.Random(0)
+    for _ in range(200):
+        tracker = EligibilityTracker({
+            requirement: rng.choice([0, 0, 1, 5])
+            for requirement in set(EVENT_REQUIREMENTS.values()) - {None}
+        })
+        for _ in range(50):
+            event = tracker.choose(rng, EVENTS, WEIGHTS)
+            requirement = EVENT_REQUIREMENTS[event]
+            assert requirement is None or tracker.counts[requirement] > 0
+
+
+def test_choose_falls_back_to_sign_up_on_empty_tables():
+    tracker = EligibilityTracker()
+    rng = random.Random(0)
+
+    assert {tracker.choose(rng, EVENTS, WEIGHTS) for _ in range(100)} == {"user sign up"}  # noqa: E501
+    assert tracker.rejected > 0
+    assert sum(tracker.owed.values()) == tracker.rejected
+
+
+def test_realized_mix_converges_to_the_weights():
+    target = MemoryTarget()
+    target.create_tables(recreate=True)
+    target.set_seed(0)
+    event_generator = EventGenerator(
+        seed=0,
+        eligibility=EligibilityTracker(target.eligibility_counts())
+    )
+
+    mix = Counter()
+    draws = 20000
+    for _ in range(draws):
+        event = event_generator.get_event()
+        validation = target.validate_event(event)
+        payload = event_generator.generate_event_payload(event, validation)
+        target.insert_event(payload)
+        event_generator.record(payload, validation)
+        mix[event] += 1
+
+    for event, weight in zip(event_generator.events, event_generator.weights):  # noqa: E501
+        assert mix[event] / draws == pytest.approx(weight / sum(WEIGHTS), abs=0.01)  # noqa: E501
+    assert event_generator.eligibility.counts == target.eligibility_counts()
+
+
+@pytest.mark.parametrize(
+    ("event", "amount", "balance", "change"),
+    [
+        ("user deposit", 1.5, Decimal("0"), 1),
+        ("user deposit", 1.5, Decimal("2.00"), 0),
+        ("user withdraw", 0.3, Decimal("0.30"), -1),
+        ("user withdraw", 0.29, Decimal("0.30"), 0),
+        ("user withdraw", 1234.56, Decimal("1234.56"), -1),
+    ],
+)
+def test_record_tracks_positive_balances(event, amount, balance, change):
+    tracker = EligibilityTracker({"balances": 3, "positive_balances": 2})
+
+    tracker.record(
+        {"event": event, "user_id": "u", "amount": amount},
+        {"user_id": "u", "amount": balance}
+    )
+
+    assert tracker.counts["positive_balances"] == 2 + change
+    assert tracker.counts["balances"] == 3
+
+
+def test_state_round_trips_through_checkpoints():
+    tracker = EligibilityTracker()
+    rng = random.Random(1)
+    for _ in range(100):
+        tracker.choose(rng, EVENTS, WEIGHTS)
+    tracker.record({"event": "user sign up"}, True)
+
+    restored = EligibilityTracker({"users": 99})
+    restored.set_state(json.loads(json.dumps(tracker.get_state())))
+
+    assert restored.get_state() == tracker.get_state()
+    assert restored.metrics() == tracker.metrics()
+    first, second = random.Random(2), random.Random(2)
+    assert [restored.choose(first, EVENTS, WEIGHTS) for _ in range(20)] == [tracker.choose(second, EVENTS, WEIGHTS) for _ in range(20)]  # noqa: E501
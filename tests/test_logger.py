@@ -0,0 +1,26 @@
+import pytest
+
+from logger import DEFAULT_SAMPLE_RATES, parse_sample_rates
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates(("payload=10", "query=5")) == {
+        "payload": 10,
+        "query": 5,
+    }
+
+
+def test_parse_sample_rates_rejects_unknown_category():
+    with pytest.raises(ValueError, match="Unknown sample category 'payloads'"):  # noqa: E501
+        parse_sample_rates(("payloads=1",))
+
+
+def test_parse_sample_rates_rejects_invalid_rate():
+    with pytest.raises(ValueError, match="expected category=N"):
+        parse_sample_rates(("payload=often",))
+
+
+def test_every_default_category_is_accepted():
+    values = tuple(f"{category}=1" for category in DEFAULT_SAMPLE_RATES)
+
+    assert parse_sample_rates(values) == dict.fromkeys(DEFAULT_SAMPLE_RATES, 1)
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from eligibility import EligibilityTracker
+from event_generator import EventGenerator
+from profiler import Profiler
+from stream import StreamRunner
+from targets import LocalTarget
+
+
+@pytest.mark.parametrize("mode", ["sampling", "deterministic"])
+def test_profiled_run_writes_stage_and_stack_reports(tmp_path, sqlite_target, mode):  # noqa: E501
+    sqlite_target.create_tables(recreate=True)
+    sqlite_target.set_seed(1)
+    profiler = Profiler(tmp_path / "profile", mode=mode, sample_interval=0.001)  # noqa: E501
+    runner = StreamRunner(
+        EventGenerator(
+            seed=1,
+            eligibility=EligibilityTracker(sqlite_target.eligibility_counts())
+        ),
+        sqlite_target,
+        [LocalTarget({"LOCAL_DIR": str(tmp_path / "out")})],
+        profiler=profiler
+    )
+
+    runner.run(0.2, 0)
+
+    report = json.loads((tmp_path / "profile" / "stages.json").read_text())
+    stages = report["stages"]
+    assert {"generate", "validate", "insert", "write:LocalTarget"} <= set(stages)  # noqa: E501
+    assert stages["generate"]["calls"] == stages["validate"]["calls"] > 0
+    assert stages["insert"]["calls"] == stages["write:LocalTarget"]["calls"] == runner.applied  # noqa: E501
+    assert 0 < stages["generate"]["share"] < 1
+
+    folded = (tmp_path / "profile" / "profile.folded").read_text()
+    assert folded
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in folded.splitlines())  # noqa: E501
+    assert (tmp_path / "profile" / "profile.pstats").exists() == (mode == "deterministic")  # noqa: E501
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        Profiler(tmp_path, mode="tracing")
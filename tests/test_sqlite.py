@@ -0,0 +1,250 @@
+import sqlite3
+import threading
+from decimal import Decimal
+
+import pytest
+
+from cdc import CdcEmitter
+from ddl import SQLITE_TABLES
+from exceptions import EventFailedValidation
+from targets import SQLiteTarget, shard_bounds, shard_prefixes
+
+
+EVENT_TS = "2024-01-01T00:00:00.000"
+
+
+class NullSink:
+    def write_batch(self, records: list[dict], batch_id: str) -> None:
+        pass
+
+
+def _sign_up(target, count: int = 1) -> list[str]:
+    for index in range(count):
+        target.insert_event({
+            "event": "user sign up",
+            "event_ts": EVENT_TS,
+            "first_name": "Ada",
+            "last_name": "Lovelace",
+            "email": f"ada{index}@example.com",
+            "dob": "1990-12-10",
+            "state": "NY",
+        })
+    target.cursor.execute("SELECT id FROM users ORDER BY rowid;")
+
+    return [row[0] for row in target.cursor.fetchall()]
+
+
+def _event(target, event: str, user_id: str, **fields) -> None:
+    target.insert_event({
+        "event": event,
+        "event_ts": EVENT_TS,
+        "user_id": user_id,
+        **fields
+    })
+
+
+def _approved(target) -> str:
+    user_id = _sign_up(target)[0]
+    _event(target, "user application open", user_id, status="pending")
+    _event(target, "user application approve", user_id, status="approved")
+
+    return user_id
+
+
+def _cents(target, user_id: str) -> int:
+    target.cursor.execute(
+        "SELECT amount FROM balances WHERE user_id = ?;",
+        (user_id,)
+    )
+
+    return target.cursor.fetchone()[0]
+
+
+@pytest.fixture
+def tables(sqlite_target):
+    sqlite_target.create_tables(recreate=True)
+    sqlite_target.set_seed(0)
+
+    return sqlite_target
+
+
+def test_create_tables_creates_tables_and_indexes(tables):
+    tables.cursor.execute("SELECT type, name FROM sqlite_master;")
+    names = {name for _, name in tables.cursor.fetchall()}
+
+    assert set(SQLITE_TABLES) <= names
+    assert {"applications_user_id", "applications_status", "balances_user_id"} <= names  # noqa: E501
+
+
+def test_create_tables_keeps_or_drops_rows(tables):
+    _sign_up(tables)
+
+    tables.create_tables(recreate=False)
+    assert tables.row_count("users") == 1
+
+    tables.create_tables(recreate=True)
+    assert tables.row_count("users") == 0
+
+
+def test_validate_event_fails_on_empty_tables(tables):
+    assert tables.validate_event("user sign up") is True
+    for event in (
+        "user update demographic",
+        "user application open",
+        "user application reject",
+        "user application approve",
+        "user deposit",
+        "user withdraw",
+    ):
+        with pytest.raises(EventFailedValidation):
+            tables.validate_event(event)
+
+
+def test_application_lifecycle(tables):
+    user_id = _sign_up(tables)[0]
+    assert tables.validate_event("user application open") == {"user_id": user_id}  # noqa: E501
+
+    _event(tables, "user application open", user_id, status="pending")
+    with pytest.raises(EventFailedValidation):
+        tables.validate_event("user application open")
+    assert tables.validate_event("user application approve") == {"user_id": user_id}  # noqa: E501
+
+    _event(tables, "user application approve", user_id, status="approved")
+    with pytest.raises(EventFailedValidation):
+        tables.validate_event("user application reject")
+    assert tables.validate_event("user deposit") == {
+        "user_id": user_id,
+        "amount": Decimal(0),
+    }
+    with pytest.raises(EventFailedValidation):
+        tables.validate_event("user withdraw")
+
+
+def test_update_demographic(tables):
+    user_id = _sign_up(tables)[0]
+    assert tables.validate_event("user update demographic") == {
+        "id": user_id,
+        "state": "NY",
+    }
+
+    tables.insert_event({
+        "event": "user update demographic",
+        "event_ts": "2024-01-02T00:00:00.000",
+        "id": user_id,
+        "state": "CA",
+    })
+
+    assert tables.validate_event("user update demographic")["state"] == "CA"  # noqa: E501
+
+
+def test_amounts_are_exact_cents(tables):
+    user_id = _approved(tables)
+
+    _event(tables, "user deposit", user_id, amount=0.1)
+    _event(tables, "user deposit", user_id, amount=0.2)
+    assert _cents(tables, user_id) == 30
+
+    validation = tables.validate_event("user withdraw")
+    assert validation["amount"] == Decimal("0.30")
+    assert isinstance(validation["amount"], Decimal)
+
+    _event(tables, "user withdraw", user_id, amount=0.29)
+    assert _cents(tables, user_id) == 1
+    _event(tables, "user withdraw", user_id, amount=0.01)
+    assert _cents(tables, user_id) == 0
+
+    assert list(tables.iter_balances()) == [(user_id, Decimal(0))]
+    with pytest.raises(EventFailedValidation):
+        tables.validate_event("user withdraw")
+
+    tables.cursor.execute("SELECT sum(amount) FROM deposits;")
+    assert tables.cursor.fetchone()[0] == 30
+    tables.cursor.execute("SELECT sum(amount) FROM withdrawals;")
+    assert tables.cursor.fetchone()[0] == 30
+
+
+def test_picks_stay_in_shard(tables):
+    tables.set_shard(1, 4)
+    user_ids = _sign_up(tables, 20)
+    lower, upper = shard_bounds(shard_prefixes(1, 4))
+    assert all(lower <= user_id <= upper for user_id in user_ids)
+
+    tables.set_shard(0, 4)
+    _sign_up(tables, 20)
+    for _ in range(50):
+        picked = tables.validate_event("user update demographic")["id"]
+        assert picked not in user_ids
+
+
+def test_picks_reach_every_row(tables):
+    user_ids = _sign_up(tables, 30)
+
+    picked = {
+        tables.validate_event("user update demographic")["id"]
+        for _ in range(1000)
+    }
+
+    assert picked == set(user_ids)
+
+
+def test_picks_see_rows_inserted_after_caching(tables):
+    user_ids = _sign_up(tables, 5)
+    for user_id in user_ids:
+        _event(tables, "user application open", user_id, status="pending")
+    tables.validate_event("user application approve")
+
+    user_id = _sign_up(tables)[-1]
+    _event(tables, "user application open", user_id, status="pending")
+    for other in user_ids:
+        _event(tables, "user application reject", other, status="rejected")
+
+    assert tables.max_rowids["applications"] == 6
+    assert tables.validate_event("user application approve") == {"user_id": user_id}  # noqa: E501
+
+
+def test_rollback_forgets_cached_rowids(tables):
+    tables.enable_checkpoints()
+    _sign_up(tables, 3)
+    tables.validate_event("user update demographic")
+
+    tables.rollback()
+
+    with pytest.raises(EventFailedValidation):
+        tables.validate_event("user update demographic")
+
+
+def test_cdc_inserts_advance_cached_rowids():
+    target = SQLiteTarget(
+        {"SQLITE_PATH": ":memory:"},
+        cdc=CdcEmitter([NullSink()])
+    )
+    target.create_tables(recreate=True)
+    target.set_seed(0)
+    _sign_up(target)
+    target.validate_event("user update demographic")
+
+    user_ids = _sign_up(target, 2)
+    picked = {
+        target.validate_event("user update demographic")["id"]
+        for _ in range(200)
+    }
+
+    assert target.max_rowids["users"] == 3
+    assert picked == set(user_ids)
+    target.close_connection()
+
+
+def test_connection_is_bound_to_its_thread(sqlite_target):
+    errors = []
+
+    def create():
+        try:
+            sqlite_target.create_tables(recreate=True)
+        except sqlite3.ProgrammingError as err:
+            errors.append(err)
+
+    thread = threading.Thread(target=create)
+    thread.start()
+    thread.join()
+
+    assert len(errors) == 1
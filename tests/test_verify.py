@@ -0,0 +1,141 @@
+import json
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+import verify
+from eligibility import EligibilityTracker
+from event_generator import EventGenerator
+from exceptions import VerificationFailed
+from stream import StreamRunner
+from targets import LocalTarget, event_key
+from verify import PARTITIONS, LocalEventLog, Verifier
+
+
+def _stream(target, output: Path, duration: float) -> StreamRunner:
+    """
+    Stream unseeded events without lag, so many share a millisecond
+    `event_ts`, writing each to its own file under `output`.
+    """
+    target.create_tables(recreate=True)
+    runner = StreamRunner(
+        EventGenerator(eligibility=EligibilityTracker(target.eligibility_counts())),  # noqa: E501
+        target,
+        [LocalTarget({"LOCAL_DIR": str(output)})]
+    )
+    runner.run(duration, 0)
+
+    return runner
+
+
+def _round_trip(target, output: Path) -> None:
+    runner = _stream(target, output, duration=1.0)
+    event_log = LocalEventLog(output)
+
+    timestamps = Counter(
+        json.loads(next(event_log.read_lines(key)))["event_ts"]
+        for key in event_log.iter_keys()
+    )
+    assert sum(timestamps.values()) == runner.applied
+    assert max(timestamps.values()) > 1
+
+    report = Verifier(event_log, target, workers=2, chunk_size=500).run()
+
+    assert report["events"] == runner.applied
+    assert report["mismatches"] == 0
+    assert report["balances_checked"] > 0
+
+
+def test_sqlite_round_trip(sqlite_target, tmp_path):
+    _round_trip(sqlite_target, tmp_path)
+
+
+def test_postgres_round_trip(postgres_target, tmp_path):
+    _round_trip(postgres_target, tmp_path)
+
+
+def test_resent_event_overwrites_its_key(tmp_path):
+    sink = LocalTarget({"LOCAL_DIR": str(tmp_path)})
+    payload = {
+        "event": "user deposit",
+        "event_ts": "2024-01-01T00:00:00.000",
+        "user_id": "00000000-0000-4000-8000-000000000000",
+        "amount": 1.0,
+    }
+    other = {**payload, "amount": 2.0}
+
+    for event in (payload, other, payload):
+        sink.write_event(event)
+
+    assert event_key("events/", payload) != event_key("events/", other)
+    assert len(list(LocalEventLog(tmp_path).iter_keys())) == 2
+
+
+def test_verifier_reports_missing_events(sqlite_target, tmp_path):
+    _stream(sqlite_target, tmp_path, duration=0.2)
+    event_log = LocalEventLog(tmp_path)
+    sign_up = next(
+        key
+        for key in event_log.iter_keys()
+        if '"user sign up"' in next(event_log.read_lines(key))
+    )
+    Path(sign_up).unlink()
+
+    with pytest.raises(VerificationFailed) as err:
+        Verifier(event_log, sqlite_target, workers=1).run()
+
+    assert err.value.report["mismatches"] >= 1
+
+
+def test_fold_spills_one_file_per_worker_and_partition(sqlite_target, tmp_path):  # noqa: E501
+    runner = _stream(sqlite_target, tmp_path / "out", duration=0.3)
+    spill_dir = tmp_path / "spill"
+    for partition in PARTITIONS:
+        (spill_dir / partition).mkdir(parents=True)
+    verifier = Verifier(
+        LocalEventLog(tmp_path / "out"),
+        sqlite_target,
+        workers=2,
+        chunk_size=10,
+        max_entries=5
+    )
+
+    counts = verifier._fold(spill_dir)
+
+    assert sum(counts.values()) == runner.applied
+    files = [len(list((spill_dir / partition).iterdir())) for partition in PARTITIONS]  # noqa: E501
+    assert 0 < max(files) <= 2
+
+
+def test_fold_bounds_chunks_in_flight(sqlite_target, tmp_path, monkeypatch):
+    runner = _stream(sqlite_target, tmp_path / "out", duration=0.3)
+    lock = threading.Lock()
+    in_flight = Counter()
+
+    def done(_) -> None:
+        with lock:
+            in_flight["now"] -= 1
+
+    class RecordingExecutor(ThreadPoolExecutor):
+        def submit(self, *args, **kwargs):
+            with lock:
+                in_flight["now"] += 1
+                in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            future = super().submit(*args, **kwargs)
+            future.add_done_callback(done)
+
+            return future
+
+    monkeypatch.setattr(verify, "ProcessPoolExecutor", RecordingExecutor)
+    report = Verifier(
+        LocalEventLog(tmp_path / "out"),
+        sqlite_target,
+        workers=2,
+        chunk_size=5
+    ).run()
+
+    assert report["events"] == runner.applied > 50
+    assert in_flight["max"] == 2 * verify.MAX_IN_FLIGHT_PER_WORKER